@@ -2,19 +2,44 @@
 import os
 from flask import Flask
 from dotenv import load_dotenv
-from library import library_bp
 
 load_dotenv()
 
 # Explicitly set template directory
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
-app = Flask(__name__, 
-            template_folder=os.path.join(BASE_DIR, 'templates'))
-app.secret_key = os.getenv("SECRET_KEY")
 
-app.register_blueprint(library_bp)
+# App factory. Nothing here opens a database connection or an outbound session:
+# the MySQL pool, the http session and Cloudinary are set up on first use in each process.
+# gunicorn "app:create_app()" or the module level app below both work
+def create_app():
+    from library import library_bp
+    from compression import response_compressor
+
+    app = Flask(__name__,
+                template_folder=os.path.join(BASE_DIR, 'templates'))
+    app.secret_key = os.getenv("SECRET_KEY")
+
+    app.register_blueprint(library_bp)
+    # gzip/brotli for HTML and JSON; downloads are streamed and left alone
+    app.after_request(response_compressor)
+    return app
+
+
+# Run in each gunicorn worker right after the fork (see gunicorn.conf.py).
+# With --preload the master imported everything; anything it opened must not be reused by the workers
+def reset_after_fork():
+    from helper_functions import reset_db_pool
+    from http_client import reset_session
+    from library import catalogue
+    reset_db_pool()
+    reset_session()
+    # Start loading the catalogue now instead of on the first request
+    catalogue.start()
+
+
+app = create_app()
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,28 @@
+import os
+
+#Largest array accepted by the batch endpoints
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 1000))
+
+
+class BatchError(ValueError):
+    pass
+
+
+#--------------------pull and check the array from a batch request body---------------
+def batch_items(data, field):
+    if not isinstance(data, dict):
+        raise BatchError("JSON body is required")
+    items = data.get(field)
+    if not isinstance(items, list) or not items:
+        raise BatchError(f"{field} must be a non-empty array")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise BatchError(f"At most {BATCH_MAX_ITEMS} {field} per request")
+    return items
+
+
+#--------------------array of jids, each a non-empty string---------------
+def batch_jids(data, field='jids'):
+    jids = batch_items(data, field)
+    if not all(isinstance(jid, str) and jid for jid in jids):
+        raise BatchError(f"every entry in {field} must be a non-empty string")
+    return jids
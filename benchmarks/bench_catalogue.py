@@ -0,0 +1,80 @@
+#Load, poll and read costs of the in-process catalogue, and its memory footprint.
+#The loaders hand back synthetic rows so only the catalogue itself is measured.
+#Run from the project root: python benchmarks/bench_catalogue.py --rows 50000 --reads 20000
+import os
+import sys
+import time
+import random
+import argparse
+from decimal import Decimal
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalogue import Catalogue
+
+SUBJECTS = ["Mathematics", "English", "Physics", "Chemistry", "Biology", "Geography", "History", "Accounts",
+            "Economics", "Shona", "Ndebele", "Agriculture", "Computer Science", "Business Studies"]
+LEVELS = ["ordinary", "advanced", "grade7"]
+
+
+def synthetic_row(book_id, started):
+    subject = SUBJECTS[book_id % len(SUBJECTS)]
+    level = LEVELS[book_id % len(LEVELS)]
+    is_paper = book_id % 3 != 0
+    name = f"{subject}_{level}_paper_{book_id}.pdf"
+    return (book_id, name, "ZIMSEC" if is_paper else "Unknown Author",
+            f"This is a {subject} question paper for the ZIMSEC {level} level November 2023 session ",
+            subject, level, 1 if is_paper else 0, Decimal("1.25"), "PDF", 2023 if is_paper else None,
+            "November" if is_paper else None, started + timedelta(minutes=book_id), random.randint(0, 500),
+            random.randint(0, 200), f"https://res.cloudinary.com/demo/raw/upload/library_books/{name}", name,
+            f"library_books/{name[:-4]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--reads", type=int, default=20000)
+    parser.add_argument("--poll-inserts", type=int, default=20)
+    parser.add_argument("--poll-deletes", type=int, default=10)
+    args = parser.parse_args()
+
+    started = datetime(2023, 1, 1)
+    #BOOK_ID n is rows[n - 1], so the poll loader can slice instead of scanning
+    rows = [synthetic_row(book_id, started) for book_id in range(1, args.rows + 1)]
+    delete_log = []
+    catalogue = Catalogue(lambda: (rows, 0, None), lambda after_id, after_log_id: (
+        rows[after_id:], [entry for entry in delete_log if entry[0] > after_log_id]))
+
+    catalogue.reload()
+    stats = catalogue.stats()
+    print(f"{stats['rows']} rows in {stats['groups']} groups, full load {stats['last_full_ms']:.1f}ms, "
+          f"{stats['memory_bytes'] / 1024 / 1024:.1f} MiB")
+
+    next_id = args.rows + 1
+    for poll in range(10):
+        rows.extend(synthetic_row(book_id, started) for book_id in range(next_id, next_id + args.poll_inserts))
+        next_id += args.poll_inserts
+        for _ in range(args.poll_deletes):
+            delete_log.append((len(delete_log) + 1, random.randint(1, args.rows), datetime.now()))
+        catalogue.poll()
+    stats = catalogue.stats()
+    print(f"poll with {args.poll_inserts} inserts and {args.poll_deletes} deletes: "
+          f"avg {stats['avg_poll_ms']:.2f}ms, max {stats['max_poll_ms']:.2f}ms")
+
+    keys = [(random.random() < 0.7, random.choice(LEVELS), random.choice(SUBJECTS)) for _ in range(args.reads)]
+    began = time.perf_counter()
+    for is_paper, level, subject in keys:
+        catalogue.page(is_paper, level, subject, 51)
+    elapsed = time.perf_counter() - began
+    print(f"{args.reads} listing pages of 50: {elapsed / args.reads * 1e6:.1f}us per page")
+
+    ids = [random.randint(1, next_id) for _ in range(args.reads)]
+    began = time.perf_counter()
+    for book_id in ids:
+        catalogue.item(book_id)
+    elapsed = time.perf_counter() - began
+    print(f"{args.reads} item lookups: {elapsed / args.reads * 1e6:.2f}us per lookup")
+
+    began = time.perf_counter()
+    groups = catalogue.group_rows()
+    print(f"dashboard groups ({len(groups)}) in {(time.perf_counter() - began) * 1000:.1f}ms")
@@ -0,0 +1,119 @@
+#Dashboard statistics benchmark on a synthetic catalogue.
+#Builds a scratch table shaped like books, then times the old eight-subquery + two GROUP BY approach
+#against the single grouped pass, before and after the covering index from migrations/001.
+#Run from the project root: python benchmarks/bench_dashboard.py --rows 1000000
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helper_functions import Get_DbConnection
+
+TABLE = "bench_books"
+LEVELS = ['ordinary', 'advanced']
+SUBJECTS = ['Mathematics', 'Physics', 'Biology', 'Chemistry', 'Computer Science', 'Combined Science',
+            'Geography', 'English', 'History', 'Commerce', 'Principles of Accounts', 'Shona',
+            'Heritage Studies', 'Agriculture', 'Statistics', 'Economics']
+
+OLD_QUERIES = [
+    f"""SELECT
+        (SELECT COUNT(case when IS_PAPER=0 then 1 END) FROM {TABLE}) AS TOTAL_BOOKS,
+        (SELECT COUNT(case when IS_PAPER=1 then 1 END) FROM {TABLE}) AS TOTAL_EXAMPAPERS,
+        (SELECT COUNT(*) FROM {TABLE} WHERE UPLOAD_DATE >=CURRENT_DATE()-INTERVAL 1 MONTH AND IS_PAPER=0) AS NEW_BOOKS,
+        (SELECT COUNT(*) FROM {TABLE} WHERE UPLOAD_DATE>=CURRENT_DATE() -INTERVAL 1 MONTH AND IS_PAPER=1) AS NEW_PAPERS,
+        (SELECT SUM(DOWNLOAD_COUNT) FROM {TABLE} WHERE IS_PAPER=0) AS TOTAL_BOOK_DOWNLOADS,
+        (SELECT SUM(DOWNLOAD_COUNT) FROM {TABLE} WHERE IS_PAPER=1) AS TOTAL_PAPER_DOWNLOADS,
+        (SELECT SUM(VIEW_COUNT) FROM {TABLE} WHERE IS_PAPER=0) AS VIEW_BOOK_TOTAL,
+        (SELECT SUM(VIEW_COUNT) FROM {TABLE} WHERE IS_PAPER=1) AS VIEW_PAPER_TOTAL
+        FROM DUAL""",
+    f"SELECT LEVEL,SUBJECT,COUNT(*) AS TOTAL FROM {TABLE} WHERE IS_PAPER=0 group by LEVEL, SUBJECT",
+    f"SELECT LEVEL, SUBJECT, COUNT(*) as TOTAL FROM {TABLE} where IS_PAPER=1 group by LEVEL, SUBJECT",
+]
+
+NEW_QUERIES = [
+    f"""SELECT IS_PAPER, LEVEL, SUBJECT, COUNT(*) AS TOTAL,
+        SUM(UPLOAD_DATE >= CURRENT_DATE() - INTERVAL 1 MONTH) AS NEW_TOTAL,
+        SUM(DOWNLOAD_COUNT) AS DOWNLOADS, SUM(VIEW_COUNT) AS VIEWS
+        FROM {TABLE} GROUP BY IS_PAPER, LEVEL, SUBJECT""",
+]
+
+
+def build_table(connection, rows):
+    cursor = connection.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"""CREATE TABLE {TABLE} (
+        BOOK_ID INT AUTO_INCREMENT PRIMARY KEY,
+        TITLE VARCHAR(255), DESCRIPTION TEXT, SUBJECT VARCHAR(100), LEVEL VARCHAR(50),
+        IS_PAPER TINYINT, UPLOAD_DATE DATETIME, DOWNLOAD_COUNT INT, VIEW_COUNT INT)""")
+    sql = (f"INSERT INTO {TABLE} (TITLE,DESCRIPTION,SUBJECT,LEVEL,IS_PAPER,UPLOAD_DATE,DOWNLOAD_COUNT,VIEW_COUNT) "
+           "VALUES (%s,%s,%s,%s,%s,%s,%s,%s)")
+    today = date.today()
+    batch = []
+    for i in range(rows):
+        batch.append((f"title_{i}.pdf", "synthetic description " * 4, random.choice(SUBJECTS), random.choice(LEVELS),
+                      1 if random.random() < 0.7 else 0, today - timedelta(days=random.randint(0, 1500)),
+                      random.randint(0, 500), random.randint(0, 2000)))
+        if len(batch) == 10000:
+            cursor.executemany(sql, batch)
+            connection.commit()
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        connection.commit()
+    cursor.close()
+
+
+def handler_reads(cursor):
+    cursor.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+    return {name: int(value) for name, value in cursor.fetchall()}
+
+
+def run(connection, label, queries, repeat):
+    cursor = connection.cursor()
+    timings = []
+    before = handler_reads(cursor)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for sql in queries:
+            cursor.execute(sql)
+            cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+    after = handler_reads(cursor)
+    cursor.close()
+    #Handler_read_first counts full index scans, Handler_read_rnd_next rows read by table scans
+    delta = {name: (after[name] - before[name]) // repeat for name in after}
+    print(f"{label:<34} statements={len(queries)} best={min(timings):.4f}s "
+          f"full_index_scans={delta.get('Handler_read_first', 0)} "
+          f"table_scan_rows={delta.get('Handler_read_rnd_next', 0)} "
+          f"index_rows={delta.get('Handler_read_next', 0)}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch table afterwards")
+    args = parser.parse_args()
+
+    connection = Get_DbConnection()
+    start = time.perf_counter()
+    build_table(connection, args.rows)
+    print(f"Built {args.rows} synthetic rows in {time.perf_counter() - start:.1f}s", flush=True)
+
+    run(connection, "old queries, no index", OLD_QUERIES, args.repeat)
+    run(connection, "single pass, no index", NEW_QUERIES, args.repeat)
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE INDEX idx_bench_dashboard ON {TABLE} "
+                   "(IS_PAPER, LEVEL, SUBJECT, UPLOAD_DATE, DOWNLOAD_COUNT, VIEW_COUNT)")
+    cursor.close()
+    run(connection, "old queries, covering index", OLD_QUERIES, args.repeat)
+    run(connection, "single pass, covering index", NEW_QUERIES, args.repeat)
+
+    if not args.keep:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP TABLE {TABLE}")
+        cursor.close()
+    connection.close()
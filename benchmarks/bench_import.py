@@ -0,0 +1,54 @@
+#Cold start benchmark: how long a fresh interpreter takes to import the app.
+#Each run is a new process, like a new gunicorn worker or autoscaled instance. The DB host is pointed at
+#an address nothing listens on, so the run also proves that importing the app opens no database connection.
+#Run from the project root: python benchmarks/bench_import.py --runs 10
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_once(module, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(1)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            timings.append((int(cumulative), name.rstrip()))
+    return elapsed, timings, result.stdout
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    env = dict(os.environ, DB_HOST="10.255.255.1", DB_PORT="3306", SECRET_KEY=os.getenv("SECRET_KEY", "bench"))
+    runs = []
+    for _ in range(args.runs):
+        elapsed, timings, output = import_once(args.module, env)
+        runs.append(elapsed)
+    runs.sort()
+    print(f"import {args.module}: min={runs[0] * 1000:.0f}ms median={runs[len(runs) // 2] * 1000:.0f}ms "
+          f"max={runs[-1] * 1000:.0f}ms over {args.runs} runs (interpreter start included)")
+    if output.strip():
+        print(f"import printed output:\n{output}")
+    #importtime indents nested imports by two spaces per level; depth 1 is what the module imports directly
+    direct = sorted(((us, name) for us, name in timings if (len(name) - len(name.lstrip()) - 1) // 2 in (1, 2)),
+                    reverse=True)
+    print(f"slowest imports made by {args.module} (last run):")
+    for us, name in direct[:args.top]:
+        print(f"  {us / 1000:8.1f}ms  {name.strip()}")
@@ -0,0 +1,100 @@
+#Text vs prepared execution for every query in queries.QUERIES, against the configured database.
+#Each query runs --iterations times as plain text on a fresh cursor (the old way) and through one cached
+#prepared cursor, first with the pure-Python connector and then with the C extension when it is installed.
+#Writes run inside a transaction that is rolled back, so the catalogue and users are left as they were.
+#Run from the project root: python benchmarks/bench_prepared.py --iterations 2000
+import os
+import sys
+import time
+import uuid
+import argparse
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mysql.connector
+from db_pool import HAVE_CEXT
+from helper_functions import db_config
+from credit_engine import DAILY_CREDITS
+from queries import QUERIES, listing_query
+
+#delete_book and insert_book are left out: timing them in a loop would churn the books table's auto-increment
+SKIPPED = {'delete_book', 'insert_book'}
+
+
+def sample_params(cursor):
+    cursor.execute("SELECT BOOK_ID, LEVEL, SUBJECT, UPLOAD_DATE FROM books ORDER BY BOOK_ID DESC LIMIT 1")
+    book = cursor.fetchone()
+    cursor.execute("SELECT jid FROM whatsapp_user LIMIT 1")
+    user = cursor.fetchone()
+    if not book or not user:
+        raise SystemExit("Need at least one row in books and whatsapp_user")
+    book_id, level, subject, upload_date = book
+    jid = user[0]
+    today = date.today()
+    params = {
+        'dashboard_groups': (),
+        'item_by_id': (book_id,),
+        'item_for_delete': (book_id,),
+        'catalogue_stamp': (),
+        'user_by_jid': (jid,),
+        'user_exists': (jid,),
+        'use_credit': (today, DAILY_CREDITS, today, jid, today),
+        'register_user': None,
+    }
+    for is_paper in (False, True):
+        for after in (None, (upload_date, book_id + 1)):
+            name, values = listing_query(is_paper, level, subject, 51, after)
+            params[name] = values
+    return params
+
+
+def run(cnx, name, params, iterations, prepared):
+    cursor = cnx.cursor(prepared=True) if prepared else None
+    sql = QUERIES[name]
+    started = time.perf_counter()
+    for i in range(iterations):
+        values = params if params is not None else (f"bench-{uuid.uuid4().hex[:16]}", "bench", date.today(),
+                                                    DAILY_CREDITS)
+        if not prepared:
+            cursor = cnx.cursor()
+        cursor.execute(sql, values)
+        if cursor.with_rows:
+            cursor.fetchall()
+        if not prepared:
+            cursor.close()
+    elapsed = time.perf_counter() - started
+    if prepared:
+        cursor.close()
+    return elapsed / iterations * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    modes = [("pure", True)] + ([("cext", False)] if HAVE_CEXT else [])
+    print(f"{args.iterations} executions per query, microseconds per call (text / prepared)")
+    results = {}
+    for label, use_pure in modes:
+        cnx = mysql.connector.connect(**dict(db_config, use_pure=use_pure))
+        cnx.autocommit = False
+        setup = cnx.cursor()
+        params = sample_params(setup)
+        setup.close()
+        for name in QUERIES:
+            if name in SKIPPED or name not in params:
+                continue
+            text = run(cnx, name, params[name], args.iterations, prepared=False)
+            prepared = run(cnx, name, params[name], args.iterations, prepared=True)
+            results.setdefault(name, {})[label] = (text, prepared)
+        cnx.rollback()
+        cnx.close()
+
+    header = "".join(f"{label + ' text':>12s}{label + ' prep':>12s}" for label, _ in modes)
+    print(f"{'query':24s}{header}")
+    for name, by_mode in results.items():
+        line = "".join(f"{by_mode[label][0]:12.1f}{by_mode[label][1]:12.1f}" for label, _ in modes)
+        print(f"{name:24s}{line}")
+    if not HAVE_CEXT:
+        print("C extension not installed; only the pure-Python connector was measured")
@@ -0,0 +1,60 @@
+#Render time per route, with and without the fragment cache.
+#The database helpers are replaced by synthetic rows so only Jinja rendering and url_for are measured.
+#Run from the project root: python benchmarks/bench_render.py --requests 500 --rows 50
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "bench")
+import library
+from app import create_app
+from fragment_cache import fragment_cache
+
+
+def synthetic_rows(count, is_paper):
+    return [{"BOOK_ID": i, "TITLE": f"Mathematics_Paper_{i}.pdf", "AUTHOR": "ZIMSEC", "LEVEL": "ordinary",
+             "SUBJECT": "Mathematics", "DESCRIPTION": "This is a Mathematics question paper for the ZIMSEC "
+             "ordinary level November 2023 session " * 2, "FILE_SIZE": 1.25, "FORMAT": "PDF", "BOOK_YEAR": 2023,
+             "EXAMINATION_SEASON": "November" if is_paper else None, "UYEAR": 2024} for i in range(count)]
+
+
+def timed(client, path, requests, cached):
+    latencies = []
+    for _ in range(requests):
+        if not cached:
+            fragment_cache.clear()
+        started = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise SystemExit(f"{path} returned {response.status_code}")
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=50)
+    args = parser.parse_args()
+
+    totals = {"TOTAL_BOOKS": 1200, "TOTAL_EXAMPAPERS": 3400}
+    book_counts = {"ordinary_Mathematics": 40, "advanced_Physics": 12}
+    paper_counts = {"ordinary_Mathematics": 120, "advanced_Economics": 30}
+    library.dashboard_cache.loader = lambda: (totals, book_counts, paper_counts)
+    library.catalogue_version.loader = lambda: {"MAX_ID": 5000, "TOTAL": 4600, "LAST_UPLOAD": "2024-06-01"}
+    library.get_book_by_subject_and_level = lambda *a: (synthetic_rows(args.rows, False), None)
+    library.get_papers_by_subject_and_level = lambda *a: (synthetic_rows(args.rows, True), None)
+
+    client = create_app().test_client()
+    routes = [("dashboard", "/"), ("view_books", "/books/ordinary/mathematics"),
+              ("view_papers", "/papers/ordinary/mathematics")]
+    print(f"{args.requests} requests per route, {args.rows} rows per listing (times in ms, p50 / p99)")
+    for name, path in routes:
+        cold = timed(client, path, args.requests, cached=False)
+        warm = timed(client, path, args.requests, cached=True)
+        print(f"{name:12s} no fragment cache {cold[0]:6.2f} / {cold[1]:6.2f}   "
+              f"cached fragments {warm[0]:6.2f} / {warm[1]:6.2f}   x{cold[0] / warm[0]:.1f}")
+    print(fragment_cache.stats())
@@ -0,0 +1,74 @@
+#Read/write split check and load test against a running server.
+#Mixes listing, dashboard and lookup reads with use-credit writes, then reads /stats to show how many
+#queries the replicas took and how credit latency behaves while the reads run.
+#Two local MySQL instances are enough, e.g. a primary on 3306 and a replica of it on 3307:
+#  DB_HOST=127.0.0.1 DB_PORT=3306 DB_REPLICA_HOSTS=127.0.0.1:3307 gunicorn app:app
+#/stats counters are per worker, so run the server with WEB_CONCURRENCY=1 for exact numbers.
+#Run from the project root: python benchmarks/bench_replicas.py --url http://127.0.0.1:5000 --requests 5000
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import requests
+
+READ_PATHS = ["/", "/books/ordinary/Mathematics", "/papers/ordinary/Mathematics", "/papers/advanced/Physics",
+              "/books/advanced/Biology"]
+
+
+def percentile(latencies, fraction):
+    return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--write-share", type=float, default=0.2, help="fraction of requests that spend a credit")
+    args = parser.parse_args()
+
+    session = requests.Session()
+    jids = [f"bench-{uuid.uuid4().hex[:12]}@s.whatsapp.net" for _ in range(50)]
+    for jid in jids:
+        session.post(f"{args.url}/user/register", json={"jid": jid, "username": "bench"}, timeout=10).raise_for_status()
+    before = session.get(f"{args.url}/stats", timeout=10).json()
+
+    def one(_):
+        is_write = random.random() < args.write_share
+        started = time.perf_counter()
+        if is_write:
+            response = session.post(f"{args.url}/user/use-credit", json={"jid": random.choice(jids)}, timeout=30)
+        else:
+            #No cookies are kept, so no request is sticky to the primary
+            response = requests.get(args.url + random.choice(READ_PATHS), timeout=30,
+                                    headers={"Accept": "application/json"})
+        return is_write, response.status_code, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    after = session.get(f"{args.url}/stats", timeout=10).json()
+
+    print(f"{args.requests} requests in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    for label, is_write in (("reads", False), ("credit writes", True)):
+        latencies = sorted(latency for write, _, latency in results if write == is_write)
+        print(f"{label:14s} n={len(latencies):5d} p50={percentile(latencies, 0.5):.1f}ms "
+              f"p99={percentile(latencies, 0.99):.1f}ms")
+    print(f"status codes: {dict(Counter(status for _, status, _ in results))}")
+    sessions_before, sessions_after = before["db_sessions"], after["db_sessions"]
+    for name in ("checkouts", "replica_checkouts", "queries", "replica_queries"):
+        print(f"{name:18s} +{sessions_after[name] - sessions_before[name]}")
+    replicas = after["db_replicas"]
+    print(f"replica failovers {replicas['failovers']}, marked down {replicas['marked_down']}")
+    for replica in replicas["replicas"]:
+        print(f"  {replica['name']} {replica['host']}:{replica['port']} down={replica['down']} "
+              f"checkouts={replica['checkouts']}")
+    if not replicas["replicas"]:
+        print("No replicas configured (DB_REPLICA_HOSTS); every query went to the primary")
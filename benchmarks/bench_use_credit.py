@@ -0,0 +1,48 @@
+#Concurrency check and load test for /user/use-credit against a running server.
+#Registers a throwaway jid, fires many parallel use-credit calls for it and checks that exactly
+#DAILY_CREDITS of them succeed and the rest get 403, i.e. no credit is ever spent twice.
+#Run from the project root: python benchmarks/bench_use_credit.py --url http://127.0.0.1:5000 --calls 5000
+import os
+import sys
+import time
+import uuid
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import requests
+from credit_engine import DAILY_CREDITS
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=64)
+    args = parser.parse_args()
+
+    jid = f"bench-{uuid.uuid4().hex[:12]}@s.whatsapp.net"
+    session = requests.Session()
+    response = session.post(f"{args.url}/user/register", json={"jid": jid, "username": "bench"}, timeout=10)
+    response.raise_for_status()
+
+    def spend(_):
+        started = time.perf_counter()
+        result = session.post(f"{args.url}/user/use-credit", json={"jid": jid}, timeout=30)
+        return result.status_code, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(spend, range(args.calls)))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for status, _ in results)
+    latencies = sorted(latency for _, latency in results)
+    print(f"{args.calls} calls in {elapsed:.2f}s ({args.calls / elapsed:.0f} req/s)")
+    print(f"p50={latencies[len(latencies) // 2] * 1000:.1f}ms p99={latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+    print(f"status codes: {dict(statuses)}")
+    if statuses.get(200, 0) != DAILY_CREDITS or statuses.get(200, 0) + statuses.get(403, 0) != args.calls:
+        print(f"FAILED: expected exactly {DAILY_CREDITS} successful spends")
+        sys.exit(1)
+    print("OK: no credit was spent twice")
@@ -0,0 +1,89 @@
+#Micro-benchmark for bulk user validation.
+#Compares the old per-call validators (regex compiled every call, phonenumbers.parse for every phone)
+#with validation.validate_many over the same synthetic records.
+#Run from the project root: python benchmarks/bench_validation.py --records 100000
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import phonenumbers
+from validation import validate_many, validation_stats
+
+
+#The validators as they were before validation.py
+def old_phone(phone, country="ZW"):
+    if not phone or str(phone).strip() == "":
+        return "phone number is requiered"
+    phone = "".join(c for c in phone if c.isdigit() or c == "+")
+    try:
+        number = phonenumbers.parse(phone, country)
+        if not phonenumbers.is_valid_number(number):
+            return "Invalid phone number"
+        return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164).replace("+", "")
+    except phonenumbers.NumberParseException as e:
+        return "Wrong phone number parsing method ", e
+
+
+def old_email(email):
+    if not email or email.strip() == "":
+        return "Email is required"
+    pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-z]{2,3}$')
+    if not bool(re.match(pattern, email)):
+        return "Invalid email entered"
+    return None
+
+
+def old_username(text):
+    if not text or text.strip() == "":
+        return "Username is required "
+    pattern = re.compile(r'^[a-zA-Z][a-zA-Z0-9]{2,19}$')
+    if not re.match(pattern, text):
+        return "Invalid username has been entered"
+    return None
+
+
+def make_records(count, distinct_phones, seed):
+    rng = random.Random(seed)
+    phones = [f"+26377{rng.randrange(1000000, 9999999)}" for _ in range(distinct_phones)]
+    phones += ["0771 234 567", "12", "not a phone", ""]
+    records = []
+    for i in range(count):
+        records.append({"phone": rng.choice(phones),
+                        "email": rng.choice([f"user{i}@example.com", "bad@", f"u{i}@mail.co.zw"]),
+                        "username": rng.choice([f"user{i % 5000}", "9bad", "ok_name"])})
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--distinct-phones", type=int, default=20000,
+                        help="bot imports repeat numbers; this controls how often")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    records = make_records(args.records, args.distinct_phones, args.seed)
+
+    started = time.perf_counter()
+    old_results = [(old_phone(r["phone"]), old_email(r["email"]), old_username(r["username"])) for r in records]
+    old_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    new_results = validate_many(records)
+    new_time = time.perf_counter() - started
+
+    old_valid = sum(1 for phone, email, username in old_results
+                    if isinstance(phone, str) and phone.isdigit() and email is None and username is None)
+    new_valid = sum(1 for result in new_results if result["valid"])
+    print(f"{args.records} records, {args.distinct_phones} distinct phones")
+    print(f"old validators: {old_time:.3f}s ({args.records / old_time:.0f} records/s)")
+    print(f"validate_many:  {new_time:.3f}s ({args.records / new_time:.0f} records/s)  x{old_time / new_time:.1f}")
+    print(f"valid records: old={old_valid} new={new_valid}")
+    print(validation_stats())
+    if old_valid != new_valid:
+        print("FAILED: old and new validators disagree")
+        sys.exit(1)
@@ -0,0 +1,339 @@
+import os
+import sys
+import time
+import bisect
+import threading
+from datetime import datetime
+from dashboard_stats import new_since
+
+#In-process copy of the books catalogue behind the listings, the dashboard counts and the item lookups.
+#Set CATALOGUE_ENABLED=0 to serve every read from the database again
+CATALOGUE_ENABLED = os.getenv('CATALOGUE_ENABLED', '1') != '0'
+#Seconds between polls for new and deleted rows
+CATALOGUE_REFRESH_INTERVAL = float(os.getenv('CATALOGUE_REFRESH_INTERVAL', 5))
+#Seconds between full reloads. Polls only see inserts and deletes, a reload also picks up edited rows
+CATALOGUE_FULL_RELOAD = float(os.getenv('CATALOGUE_FULL_RELOAD', 900))
+#Polls look this many ids below the highest one seen, for inserts that committed out of id order
+CATALOGUE_ID_OVERLAP = int(os.getenv('CATALOGUE_ID_OVERLAP', 100))
+
+#Column order of the catalogue queries; rows arrive as plain tuples in this order
+CATALOGUE_COLUMNS = ("BOOK_ID", "TITLE", "AUTHOR", "DESCRIPTION", "SUBJECT", "LEVEL", "IS_PAPER", "FILE_SIZE",
+                     "FORMAT", "BOOK_YEAR", "EXAMINATION_SEASON", "UPLOAD_DATE", "VIEW_COUNT", "DOWNLOAD_COUNT",
+                     "FILE_PATH", "FILENAME", "CLOUDINARY_PUBLIC_ID")
+#Fields handed to view_pdf, download_pdf and delete, a superset of the item_by_id query
+ITEM_FIELDS = ("BOOK_ID", "IS_PAPER", "LEVEL", "SUBJECT", "FILE_PATH", "FILENAME", "CLOUDINARY_PUBLIC_ID",
+               "UPLOAD_DATE", "VIEW_COUNT", "DOWNLOAD_COUNT")
+#Text repeated across thousands of rows is stored once; paper descriptions come from one template
+_INTERNED = frozenset(("AUTHOR", "DESCRIPTION", "SUBJECT", "LEVEL", "FORMAT", "EXAMINATION_SEASON"))
+
+
+#--------------------one catalogue row, no per-instance dict---------------
+class CatalogueRow:
+    __slots__ = CATALOGUE_COLUMNS
+
+    def __init__(self, values):
+        for name, value in zip(CATALOGUE_COLUMNS, values):
+            if name in _INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, name, value)
+        #Uploads store the file name as the title too; keep one copy
+        if self.FILENAME == self.TITLE:
+            self.FILENAME = self.TITLE
+
+    #Listings match SUBJECT and LEVEL like the default MySQL collation does, ignoring case
+    def group_key(self):
+        return self.IS_PAPER == 1, (self.LEVEL or '').lower(), (self.SUBJECT or '').lower()
+
+    #Same keys as the books_listing and papers_listing queries
+    def listing(self, is_paper):
+        upload_date = self.UPLOAD_DATE
+        row = {'BOOK_ID': self.BOOK_ID, 'TITLE': self.TITLE, 'AUTHOR': self.AUTHOR, 'DESCRIPTION': self.DESCRIPTION,
+               'FILE_SIZE': self.FILE_SIZE, 'FORMAT': self.FORMAT, 'BOOK_YEAR': self.BOOK_YEAR,
+               'UYEAR': upload_date.year if upload_date else None, 'UPLOAD_DATE': upload_date}
+        if is_paper:
+            row['EXAMINATION_SEASON'] = self.EXAMINATION_SEASON
+            row['VIEWS'] = self.VIEW_COUNT or 0
+            row['DOWNLOADS'] = self.DOWNLOAD_COUNT or 0
+        return row
+
+    def item(self):
+        return {name: getattr(self, name) for name in ITEM_FIELDS}
+
+
+#Groups are kept in ascending (UPLOAD_DATE, BOOK_ID) order; listings read them backwards
+def _row_key(row):
+    return row.UPLOAD_DATE or datetime.min, row.BOOK_ID
+
+
+#--------------------in-process catalogue with incremental refresh---------------
+class Catalogue:
+    def __init__(self, load_all, load_changes, interval=CATALOGUE_REFRESH_INTERVAL, full_reload=CATALOGUE_FULL_RELOAD,
+                 overlap=CATALOGUE_ID_OVERLAP, enabled=CATALOGUE_ENABLED, on_delete=None):
+        #load_all() returns (rows, log_id, last_delete): every books row as a CATALOGUE_COLUMNS tuple and the
+        #newest delete log id and time.
+        #load_changes(after_id, after_log_id) returns (rows, deletes) with deletes as (LOG_ID, BOOK_ID, DELETED_AT).
+        #Both raise on database errors.
+        #on_delete(book_id) is called for every row another worker (or this one) deleted, so per-process
+        #caches outside the catalogue can drop it too
+        self.load_all = load_all
+        self.on_delete = on_delete
+        self.load_changes = load_changes
+        self.interval = interval
+        self.full_reload = full_reload
+        self.overlap = overlap
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.by_id = None
+        self.groups = {}
+        self.max_id = 0
+        self.log_id = 0
+        self.last_delete = None
+        self.full_at = 0.0
+        self.generation = 0
+        self._stamp = None
+        self._footprint = (None, 0)
+        #Rows this worker deleted whose delete log entry it has not read yet. A lagging replica may
+        #still return them, so they are kept out until the entry arrives
+        self.removed_here = set()
+        self.full_loads = 0
+        self.polls = 0
+        self.added = 0
+        self.removed = 0
+        self.failures = 0
+        self.last_full_time = 0.0
+        self.last_poll_time = 0.0
+        self.max_poll_time = 0.0
+        self.poll_time = 0.0
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.thread_pid = None
+
+    #--------------------whether reads can be served from this copy---------------
+    #Requests never load or poll themselves. Until the background load finishes they go to the database,
+    #and during a full reload they keep reading the old copy until the new one is swapped in
+    def ready(self):
+        if not self.enabled:
+            return False
+        self.start()
+        with self.lock:
+            return self.by_id is not None
+
+    #The refresher thread does not survive a fork, so each worker starts its own (see app.reset_after_fork)
+    def start(self):
+        pid = os.getpid()
+        if not self.enabled or (self.thread_pid == pid and self.thread is not None):
+            return
+        with self.lock:
+            if self.thread_pid == pid and self.thread is not None:
+                return
+            self.thread_pid = pid
+            self.thread = threading.Thread(target=self._run, name="catalogue-refresh", daemon=True)
+            self.thread.start()
+
+    #First load at once, then a poll every interval and a full reload every full_reload seconds.
+    #A failed refresh is retried after one interval
+    def _run(self):
+        while True:
+            with self.lock:
+                full = self.by_id is None or time.monotonic() - self.full_at >= self.full_reload
+            try:
+                if full:
+                    self.reload()
+                else:
+                    self.poll()
+            except Exception as err:
+                print(f"Catalogue refresh error: {err}")
+                with self.lock:
+                    self.failures += 1
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def reload(self):
+        started = time.perf_counter()
+        values, log_id, last_delete = self.load_all()
+        by_id = {}
+        groups = {}
+        for value in values:
+            row = CatalogueRow(value)
+            by_id[row.BOOK_ID] = row
+            groups.setdefault(row.group_key(), []).append(row)
+        for rows in groups.values():
+            rows.sort(key=_row_key)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            #Rows that vanished since the last copy were deleted even if their log entries were skipped
+            gone = [book_id for book_id in self.by_id if book_id not in by_id] if self.by_id is not None else []
+            #Deletes that raced the read are in the log after log_id and are replayed by the next poll
+            self.by_id = by_id
+            self.groups = groups
+            for book_id in self.removed_here:
+                self._remove(book_id)
+            self.max_id = max(by_id, default=0)
+            self.log_id = log_id or 0
+            self.last_delete = last_delete
+            self.full_at = time.monotonic()
+            self.generation += 1
+            self._stamp = None
+            self.full_loads += 1
+            self.last_full_time = elapsed
+        self._deleted(gone)
+
+    def poll(self):
+        started = time.perf_counter()
+        with self.lock:
+            after_id = max(self.max_id - self.overlap, 0)
+            after_log_id = self.log_id
+        values, deletes = self.load_changes(after_id, after_log_id)
+        with self.lock:
+            for value in values:
+                row = CatalogueRow(value)
+                self.max_id = max(self.max_id, row.BOOK_ID)
+                if row.BOOK_ID not in self.by_id and row.BOOK_ID not in self.removed_here:
+                    self._insert(row)
+            for log_id, book_id, deleted_at in deletes:
+                self._remove(book_id)
+                self.removed_here.discard(book_id)
+                self.log_id = max(self.log_id, log_id)
+                if deleted_at and (self.last_delete is None or deleted_at > self.last_delete):
+                    self.last_delete = deleted_at
+                    self._stamp = None
+            elapsed = time.perf_counter() - started
+            self.polls += 1
+            self.last_poll_time = elapsed
+            self.max_poll_time = max(self.max_poll_time, elapsed)
+            self.poll_time += elapsed
+        self._deleted([book_id for _log_id, book_id, _deleted_at in deletes])
+
+    def _deleted(self, book_ids):
+        if self.on_delete is None:
+            return
+        for book_id in book_ids:
+            self.on_delete(book_id)
+
+    def _insert(self, row):
+        self.by_id[row.BOOK_ID] = row
+        bisect.insort(self.groups.setdefault(row.group_key(), []), row, key=_row_key)
+        self.generation += 1
+        self._stamp = None
+        self.added += 1
+
+    def _remove(self, book_id):
+        row = self.by_id.pop(book_id, None) if self.by_id is not None else None
+        if row is None:
+            return False
+        key = row.group_key()
+        rows = self.groups.get(key, [])
+        index = bisect.bisect_left(rows, _row_key(row), key=_row_key)
+        if index < len(rows) and rows[index] is row:
+            del rows[index]
+        elif row in rows:
+            rows.remove(row)
+        if not rows:
+            self.groups.pop(key, None)
+        self.generation += 1
+        self._stamp = None
+        self.removed += 1
+        return True
+
+    #Poll at once, e.g. after an upload made by this worker
+    def invalidate(self):
+        self.wakeup.set()
+
+    #--------------------changes made by this worker, applied before the next poll---------------
+    def remove(self, book_id):
+        with self.lock:
+            self.removed_here.add(book_id)
+            return self._remove(book_id)
+
+    def record_view(self, book_id, amount=1):
+        with self.lock:
+            row = self.by_id.get(book_id) if self.by_id is not None else None
+            if row is not None:
+                row.VIEW_COUNT = (row.VIEW_COUNT or 0) + amount
+
+    def record_download(self, book_id, amount=1):
+        with self.lock:
+            row = self.by_id.get(book_id) if self.by_id is not None else None
+            if row is not None:
+                row.DOWNLOAD_COUNT = (row.DOWNLOAD_COUNT or 0) + amount
+
+    #--------------------reads---------------
+    #One keyset page, newest first; after is the decoded (UPLOAD_DATE, BOOK_ID) cursor or None
+    def page(self, is_paper, level, subject, limit, after=None):
+        key = (bool(is_paper), (level or '').lower(), (subject or '').lower())
+        with self.lock:
+            rows = self.groups.get(key, ())
+            end = len(rows) if after is None else bisect.bisect_left(rows, tuple(after), key=_row_key)
+            picked = rows[max(end - limit, 0):end]
+        return [row.listing(is_paper) for row in reversed(picked)]
+
+    def item(self, book_id):
+        with self.lock:
+            row = self.by_id.get(book_id) if self.by_id is not None else None
+            return row.item() if row is not None else None
+
+    #Same rows as the dashboard_groups query, for fold_group_rows
+    def group_rows(self):
+        since = datetime.combine(new_since(), datetime.min.time())
+        with self.lock:
+            groups = [list(rows) for rows in self.groups.values()]
+        result = []
+        for rows in groups:
+            first = rows[0]
+            result.append({'IS_PAPER': 1 if first.IS_PAPER == 1 else 0, 'LEVEL': first.LEVEL, 'SUBJECT': first.SUBJECT,
+                           'TOTAL': len(rows),
+                           'NEW_TOTAL': sum(1 for row in rows if row.UPLOAD_DATE and row.UPLOAD_DATE >= since),
+                           'DOWNLOADS': sum(row.DOWNLOAD_COUNT or 0 for row in rows),
+                           'VIEWS': sum(row.VIEW_COUNT or 0 for row in rows)})
+        return result
+
+    #Same fields as the catalogue_stamp query, taken from this copy so ETags follow what the listings show
+    def stamp(self):
+        with self.lock:
+            if self.by_id is None:
+                return None
+            if self._stamp is None:
+                dates = [row.UPLOAD_DATE for row in self.by_id.values() if row.UPLOAD_DATE]
+                self._stamp = {'MAX_ID': max(self.by_id, default=None), 'LAST_UPLOAD': max(dates, default=None),
+                               'TOTAL': len(self.by_id), 'LAST_DELETE': self.last_delete}
+            return dict(self._stamp)
+
+    #--------------------memory footprint, measured once per catalogue generation---------------
+    #Rows, the distinct values they point at and both indexes. Interned strings are counted once
+    def memory_bytes(self):
+        with self.lock:
+            if self.by_id is None:
+                return 0
+            generation, size = self._footprint
+            if generation == self.generation:
+                return size
+            generation = self.generation
+            rows = list(self.by_id.values())
+            total = sys.getsizeof(self.by_id) + sys.getsizeof(self.groups)
+            total += sum(sys.getsizeof(group) + sys.getsizeof(key) for key, group in self.groups.items())
+        seen = set()
+        for row in rows:
+            total += sys.getsizeof(row)
+            for name in CATALOGUE_COLUMNS:
+                value = getattr(row, name)
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+        with self.lock:
+            self._footprint = (generation, total)
+        return total
+
+    def stats(self):
+        memory = self.memory_bytes()
+        with self.lock:
+            loaded = self.by_id is not None
+            return {"enabled": self.enabled, "loaded": loaded, "rows": len(self.by_id) if loaded else 0,
+                    "groups": len(self.groups), "max_id": self.max_id, "log_id": self.log_id,
+                    "memory_bytes": memory, "full_loads": self.full_loads, "polls": self.polls,
+                    "added": self.added, "removed": self.removed, "pending_deletes": len(self.removed_here),
+                    "failures": self.failures,
+                    "last_full_ms": round(self.last_full_time * 1000, 2),
+                    "last_poll_ms": round(self.last_poll_time * 1000, 2),
+                    "max_poll_ms": round(self.max_poll_time * 1000, 2),
+                    "avg_poll_ms": round(self.poll_time * 1000 / self.polls, 2) if self.polls else None,
+                    "interval": self.interval, "full_reload": self.full_reload}
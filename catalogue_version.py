@@ -0,0 +1,105 @@
+import os
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+#Seconds a worker trusts its catalogue stamp before asking the database again.
+#Uploads and deletes made by the same worker refresh it at once
+CATALOGUE_VERSION_TTL = float(os.getenv('CATALOGUE_VERSION_TTL', 5))
+#Cache-Control max-age for listings and the dashboard. Revalidation after that is a cheap 304
+LISTING_MAX_AGE = int(os.getenv('LISTING_MAX_AGE', 60))
+DASHBOARD_MAX_AGE = int(os.getenv('DASHBOARD_MAX_AGE', 30))
+
+
+#--------------------last change to the catalogue, for Last-Modified---------------
+#Taken from the data so every worker sends the same value: the newest upload or the newest entry in the
+#delete log, whichever is later. DATETIME columns are stored in UTC
+def last_modified(row):
+    stamps = [stamp for stamp in (row.get('LAST_UPLOAD'), row.get('LAST_DELETE')) if isinstance(stamp, datetime)]
+    if not stamps:
+        return None
+    newest = max(stamp.replace(tzinfo=None) for stamp in stamps)
+    return newest.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+#--------------------catalogue version stamp---------------
+#The stamp is (MAX(BOOK_ID), MAX(UPLOAD_DATE), COUNT(*)). An upload raises the max id; a delete lowers the
+#row count, which serves as the delete generation and is shared by every worker without extra bookkeeping
+class CatalogueVersion:
+    def __init__(self, loader, ttl=CATALOGUE_VERSION_TTL):
+        #loader returns a dict with MAX_ID, LAST_UPLOAD, TOTAL and LAST_DELETE, or None on failure
+        self.loader = loader
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.token = None
+        self.changed_at = None
+        self.loaded_at = 0.0
+        self.refreshing = False
+        self.loads = 0
+        self.changes = 0
+
+    def refresh(self):
+        row = self.loader()
+        if row is None:
+            return False
+        token = f"{row.get('MAX_ID') or 0}-{row.get('TOTAL') or 0}-{row.get('LAST_UPLOAD') or ''}"
+        with self.lock:
+            if token != self.token:
+                self.token = token
+                self.changes += 1
+            self.changed_at = last_modified(row)
+            self.loaded_at = time.monotonic()
+            self.loads += 1
+        return True
+
+    #Returns (token, changed_at) or (None, None) when the stamp cannot be loaded
+    def get(self):
+        with self.lock:
+            expired = self.token is None or time.monotonic() - self.loaded_at >= self.ttl
+            should_refresh = expired and not self.refreshing
+            if should_refresh:
+                self.refreshing = True
+        if should_refresh:
+            try:
+                self.refresh()
+            finally:
+                with self.lock:
+                    self.refreshing = False
+        with self.lock:
+            return self.token, self.changed_at
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = 0.0
+
+    def stats(self):
+        with self.lock:
+            return {"token": self.token, "changed_at": self.changed_at.isoformat() if self.changed_at else None,
+                    "loads": self.loads, "changes": self.changes, "ttl": self.ttl}
+
+
+#--------------------ETag for one representation of a route---------------
+def make_etag(*parts):
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+
+
+#--------------------conditional request check, before any query runs---------------
+def is_not_modified(request, etag, last_modified=None):
+    if request.if_none_match:
+        #Weak comparison: compressed responses carry the same ETag marked W/
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def set_cache_headers(response, etag, last_modified=None, max_age=LISTING_MAX_AGE):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    #HTML and JSON are served from the same URL
+    response.vary.add('Accept')
+    return response
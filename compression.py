@@ -0,0 +1,140 @@
+import os
+import gzip
+import threading
+from collections import OrderedDict
+
+#brotli is optional. Without it every client that accepts gzip still gets gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#Bodies smaller than this are sent as they are; the headers would eat most of the saving
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+#Compressed bodies of responses with an ETag are kept up to this many bytes in total
+COMPRESS_CACHE_MAX_BYTES = int(os.getenv('COMPRESS_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+COMPRESSIBLE_TYPES = {'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript',
+                      'application/json'}
+
+
+def _gzip(body):
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _brotli(body):
+    return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+
+
+#Flash messages rendered by this response. get_flashed_messages moves them from the session onto the
+#request context. A safety net in case a view sets an ETag on a page that shows them
+def _shows_flashes():
+    from flask.globals import request_ctx
+    return bool(getattr(request_ctx, 'flashes', None))
+
+
+#--------------------compressed bodies keyed by (ETag, encoding)---------------
+#Same ETag means same body, so a hot listing or the dashboard is compressed once per worker.
+#The views leave the ETag out when they render flash messages, so an ETag is a safe key on its own
+class CompressedCache:
+    def __init__(self, max_bytes=COMPRESS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _key, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+class ResponseCompressor:
+    def __init__(self, min_size=COMPRESS_MIN_SIZE, cache=None):
+        self.min_size = min_size
+        self.cache = cache if cache is not None else CompressedCache()
+        self.lock = threading.Lock()
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def choose_encoding(self, request):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    #--------------------after_request hook---------------
+    def __call__(self, response):
+        from flask import request
+        #send_file and the download proxy stream their bodies; those are PDFs and stay untouched
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding(request)
+        if encoding is None or (response.content_length or 0) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        body = None
+        key = (etag, encoding) if etag and not _shows_flashes() else None
+        if key:
+            body = self.cache.get(key)
+        raw_size = response.content_length
+        if body is None:
+            raw = response.get_data()
+            body = _brotli(raw) if encoding == 'br' else _gzip(raw)
+            if key:
+                self.cache.put(key, body)
+        with self.lock:
+            self.compressed += 1
+            self.bytes_in += raw_size
+            self.bytes_out += len(body)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            #The compressed bytes differ from the identity body, so the validator becomes weak (as nginx does)
+            response.set_etag(etag, weak=True)
+        return response
+
+    def stats(self):
+        with self.lock:
+            stats = {"compressed": self.compressed, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                     "brotli": brotli is not None, "min_size": self.min_size}
+        stats["cache"] = self.cache.stats()
+        return stats
+
+
+response_compressor = ResponseCompressor()
@@ -0,0 +1,250 @@
+import os
+import hashlib
+import tempfile
+import threading
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#Local disk cache for books and papers fetched from cloudinary. Shared by all workers on the machine
+CONTENT_CACHE_DIR = os.getenv('CONTENT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'swiftlab_content_cache'))
+CONTENT_CACHE_MAX_BYTES = int(os.getenv('CONTENT_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+#Files bigger than this are streamed straight from cloudinary and never cached
+CONTENT_CACHE_MAX_ENTRY_BYTES = int(os.getenv('CONTENT_CACHE_MAX_ENTRY_BYTES', 200 * 1024 * 1024))
+CONTENT_CACHE_ENABLED = os.getenv('CONTENT_CACHE_ENABLED', '1') != '0'
+#A fixed set of locks shared out by key hash, so neither the lock table nor the lock files on disk
+#grow with the catalogue. Two keys on one stripe just means the second download is not cached this time
+CONTENT_CACHE_LOCK_STRIPES = 64
+
+_stripe_locks = [threading.Lock() for _ in range(CONTENT_CACHE_LOCK_STRIPES)]
+
+
+#Cloudinary public id when we have one, otherwise the BOOK_ID
+def item_key(public_id, book_id):
+    return public_id or f"book:{book_id}"
+
+
+def _cache_key(key):
+    return hashlib.sha1(str(key).encode("utf-8")).hexdigest()
+
+
+def _data_path(key):
+    return os.path.join(CONTENT_CACHE_DIR, _cache_key(key) + ".bin")
+
+
+def _stripe(key):
+    return int(_cache_key(key)[:8], 16) % CONTENT_CACHE_LOCK_STRIPES
+
+
+def _lock_path(key):
+    return os.path.join(CONTENT_CACHE_DIR, f"stripe-{_stripe(key):02d}.lock")
+
+
+#--------------------look up a cached file and mark it as recently used---------------
+def lookup(key):
+    if not CONTENT_CACHE_ENABLED or not key:
+        return None
+    path = _data_path(key)
+    try:
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        return None
+    except OSError as err:
+        print(f"Content cache error: {err}")
+        return None
+
+
+#--------------------one fill per key across threads and worker processes---------------
+#Never waits: a key that is already being filled is streamed from the origin again without caching
+class _KeyLock:
+    def __init__(self, key):
+        self.key = key
+        self.thread_lock = _stripe_locks[_stripe(key)]
+        self.lock_file = None
+        self.held = False
+
+    def try_acquire(self):
+        if not self.thread_lock.acquire(blocking=False):
+            return False
+        self.held = True
+        if fcntl is None:
+            return True
+        try:
+            self.lock_file = open(_lock_path(self.key), "a")
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self.release()
+            return False
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        if not self.held:
+            return
+        self.held = False
+        if self.lock_file is not None:
+            try:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            finally:
+                self.lock_file.close()
+                self.lock_file = None
+        self.thread_lock.release()
+
+
+#--------------------copy of a download on its way to the client---------------
+#The proxy writes every chunk it relays; commit() moves the finished file into the cache atomically
+class CacheFill:
+    def __init__(self, key, lock, expected_size=0):
+        self.key = key
+        self.lock = lock
+        self.expected_size = expected_size
+        fd, self.tmp_path = tempfile.mkstemp(dir=CONTENT_CACHE_DIR, suffix=".part")
+        self.tmp_file = os.fdopen(fd, "wb")
+        self.written = 0
+        self.done = False
+
+    def write(self, chunk):
+        if self.done:
+            return
+        self.written += len(chunk)
+        if self.written > CONTENT_CACHE_MAX_ENTRY_BYTES:
+            self.abort()
+            return
+        try:
+            self.tmp_file.write(chunk)
+        except OSError as err:
+            print(f"Content cache write failed for {self.key}: {err}")
+            self.abort()
+
+    def commit(self):
+        if self.done:
+            return None
+        path = _data_path(self.key)
+        try:
+            self.tmp_file.flush()
+            os.fsync(self.tmp_file.fileno())
+            self.tmp_file.close()
+            if self.expected_size and self.written != self.expected_size:
+                raise IOError(f"Short read from origin: {self.written} of {self.expected_size} bytes")
+            os.replace(self.tmp_path, path)
+        except Exception as err:
+            print(f"Content cache fill failed for {self.key}: {err}")
+            self.abort()
+            return None
+        self.done = True
+        self.lock.release()
+        evict()
+        return path
+
+    #Client went away, the origin failed or the file outgrew the cache. Safe to call more than once
+    def abort(self):
+        if self.done:
+            return
+        self.done = True
+        try:
+            self.tmp_file.close()
+        except OSError:
+            pass
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            print(f"Content cache cleanup error: {err}")
+        self.lock.release()
+
+
+#--------------------start caching a download that is about to be streamed---------------
+#Returns a CacheFill, or None when the file should just be streamed: cache off, file too big,
+#or another request is filling the same key right now
+def begin_fill(key, expected_size=0):
+    if not CONTENT_CACHE_ENABLED or not key or expected_size > CONTENT_CACHE_MAX_ENTRY_BYTES:
+        return None
+    lock = None
+    try:
+        os.makedirs(CONTENT_CACHE_DIR, exist_ok=True)
+        lock = _KeyLock(key)
+        if not lock.try_acquire():
+            return None
+        #Another worker may have finished it a moment ago
+        if lookup(key):
+            lock.release()
+            return None
+        return CacheFill(key, lock, expected_size)
+    except Exception as err:
+        print(f"Content cache fill could not start for {key}: {err}")
+        if lock is not None:
+            lock.release()
+        return None
+
+
+#--------------------drop a file from the cache---------------
+def invalidate(key):
+    if not key:
+        return
+    try:
+        os.unlink(_data_path(key))
+    except FileNotFoundError:
+        pass
+    except OSError as err:
+        print(f"Content cache invalidation error: {err}")
+
+
+#--------------------least recently used eviction down to the size budget---------------
+def evict(max_bytes=None):
+    max_bytes = CONTENT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    total = 0
+    try:
+        with os.scandir(CONTENT_CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".lock") and not entry.name.startswith("stripe-"):
+                    #Per-key lock file left by an older version
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+                    continue
+                if not entry.name.endswith(".bin"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    if total <= max_bytes:
+        return removed
+    entries.sort()
+    for _mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+            removed += 1
+        except FileNotFoundError:
+            total -= size
+    return removed
+
+
+#--------------------cache size for the stats route---------------
+def cache_stats():
+    files = 0
+    total = 0
+    try:
+        with os.scandir(CONTENT_CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".bin"):
+                    files += 1
+                    total += entry.stat().st_size
+    except FileNotFoundError:
+        pass
+    return {"enabled": CONTENT_CACHE_ENABLED, "files": files, "bytes": total, "max_bytes": CONTENT_CACHE_MAX_BYTES}
@@ -0,0 +1,154 @@
+import os
+import atexit
+import threading
+from helper_functions import Get_DbConnection
+
+#How often buffered counters are written. This is also the most we can lose if a worker is killed
+COUNTER_FLUSH_INTERVAL = float(os.getenv('COUNTER_FLUSH_INTERVAL', 5))
+#Flush early once this many distinct rows are waiting
+COUNTER_FLUSH_MAX_PENDING = int(os.getenv('COUNTER_FLUSH_MAX_PENDING', 1000))
+#Rows per multi-row UPDATE statement
+COUNTER_BATCH_SIZE = int(os.getenv('COUNTER_BATCH_SIZE', 500))
+
+#counter name -> (table, key column, counted column)
+COUNTER_TARGETS = {
+    'book_views': ('books', 'BOOK_ID', 'VIEW_COUNT'),
+    'book_downloads': ('books', 'BOOK_ID', 'DOWNLOAD_COUNT'),
+    'user_downloads': ('whatsapp_user', 'jid', 'download_count'),
+}
+
+
+#--------------------in-process write-behind counter aggregator---------------
+class CounterBuffer:
+    def __init__(self, connect=Get_DbConnection, interval=COUNTER_FLUSH_INTERVAL,
+                 max_pending=COUNTER_FLUSH_MAX_PENDING, batch_size=COUNTER_BATCH_SIZE):
+        self.connect = connect
+        self.interval = interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.pending = {name: {} for name in COUNTER_TARGETS}
+        self.pending_rows = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.thread_pid = None
+        self.flushed = 0
+        self.failed_flushes = 0
+
+    def add(self, name, key, amount=1):
+        if name not in COUNTER_TARGETS:
+            raise KeyError(f"Unknown counter {name}")
+        self._ensure_thread()
+        with self.lock:
+            counts = self.pending[name]
+            if key not in counts:
+                self.pending_rows += 1
+            counts[key] = counts.get(key, 0) + amount
+            full = self.pending_rows >= self.max_pending
+        if full:
+            self.wakeup.set()
+        return True
+
+    #The flusher thread does not survive a fork, so each worker starts its own on first use
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self.thread_pid == pid and self.thread is not None:
+            return
+        with self.lock:
+            if self.thread_pid == pid and self.thread is not None:
+                return
+            if self.thread_pid is not None and self.thread_pid != pid:
+                self.pending = {name: {} for name in COUNTER_TARGETS}
+                self.pending_rows = 0
+            self.thread_pid = pid
+            self.thread = threading.Thread(target=self._run, name="counter-flusher", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def _take(self):
+        with self.lock:
+            taken = self.pending
+            self.pending = {name: {} for name in COUNTER_TARGETS}
+            self.pending_rows = 0
+        return taken
+
+    #Failed batches go back into the buffer so the next flush retries them
+    def _restore(self, taken):
+        with self.lock:
+            for name, counts in taken.items():
+                current = self.pending[name]
+                for key, amount in counts.items():
+                    if key not in current:
+                        self.pending_rows += 1
+                    current[key] = current.get(key, 0) + amount
+
+    def _batch_statements(self, taken):
+        for name, counts in taken.items():
+            if not counts:
+                continue
+            table, key_column, column = COUNTER_TARGETS[name]
+            items = list(counts.items())
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                cases = " ".join(["WHEN %s THEN %s"] * len(batch))
+                placeholders = ",".join(["%s"] * len(batch))
+                sql = (f"UPDATE {table} SET {column}=COALESCE({column},0)+CASE {key_column} {cases} END "
+                       f"WHERE {key_column} IN ({placeholders})")
+                params = [value for pair in batch for value in pair] + [key for key, _amount in batch]
+                yield sql, params
+
+    #--------------------write everything buffered so far in one transaction---------------
+    def flush(self):
+        with self.flush_lock:
+            taken = self._take()
+            if not any(taken.values()):
+                return 0
+            connection = None
+            cursor = None
+            try:
+                connection = self.connect()
+                cursor = connection.cursor()
+                for sql, params in self._batch_statements(taken):
+                    cursor.execute(sql, params)
+                connection.commit()
+                rows = sum(len(counts) for counts in taken.values())
+                self.flushed += rows
+                return rows
+            except Exception as err:
+                print(f"Counter flush failed: {err}")
+                self.failed_flushes += 1
+                if connection:
+                    try:
+                        connection.rollback()
+                    except:
+                        pass
+                self._restore(taken)
+                return 0
+            finally:
+                if cursor:
+                    try:
+                        cursor.close()
+                    except:
+                        pass
+                if connection:
+                    try:
+                        connection.close()
+                    except:
+                        pass
+
+    def stats(self):
+        with self.lock:
+            pending_rows = self.pending_rows
+        return {"pending_rows": pending_rows, "flushed_rows": self.flushed,
+                "failed_flushes": self.failed_flushes, "flush_interval": self.interval}
+
+
+counter_buffer = CounterBuffer()
+#Last chance to write buffered counts when the worker shuts down cleanly
+atexit.register(counter_buffer.flush)
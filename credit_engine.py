@@ -0,0 +1,73 @@
+from datetime import date
+
+#Credits every WhatsApp user gets per day
+DAILY_CREDITS = 5
+
+#Daily reset, balance check and decrement in one statement. Row locking makes concurrent calls for
+#one jid queue up, so a credit can never be spent twice. LAST_INSERT_ID(expr) hands the new balance
+#back in the OK packet, which the connector exposes as cursor.lastrowid, so no SELECT is needed
+USE_CREDIT_SQL = """UPDATE whatsapp_user
+    SET credits=LAST_INSERT_ID(IF(last_reset=%s, credits, %s)-1), last_reset=%s
+    WHERE jid=%s AND (last_reset IS NULL OR last_reset<>%s OR credits>0)"""
+USER_EXISTS_SQL = "SELECT 1 FROM whatsapp_user WHERE jid=%s"
+
+
+#--------------------credits a user has right now, without writing the reset---------------
+def effective_credits(credits, last_reset, today=None):
+    today = today or date.today()
+    if last_reset != today:
+        return DAILY_CREDITS
+    return credits or 0
+
+
+#--------------------spend one credit---------------
+#Returns (status, remaining) where status is 'ok' or 'refused'. A refused spend is explained by refusal_reason
+def spend_credit(cursor, jid, today=None):
+    today = today or date.today()
+    cursor.execute(USE_CREDIT_SQL, (today, DAILY_CREDITS, today, jid, today))
+    if cursor.rowcount == 1:
+        return 'ok', cursor.lastrowid or 0
+    return 'refused', 0
+
+
+#--------------------why a spend was refused: 'not_found' or 'no_credits'---------------
+#Only a failed spend pays for this second round-trip. Callers run it on its own 'user_exists' statement
+#so the cached 'use_credit' cursor is not re-prepared for a different query
+def refusal_reason(cursor, jid):
+    cursor.execute(USER_EXISTS_SQL, (jid,))
+    if not cursor.fetchall():
+        return 'not_found'
+    return 'no_credits'
+
+
+#--------------------spend credits for many jids in one transaction---------------
+#A jid may appear several times; each occurrence spends one credit while any are left.
+#Returns one (status, remaining) per input jid, in input order
+def spend_credits_batch(cursor, jids, today=None):
+    today = today or date.today()
+    distinct = list(dict.fromkeys(jids))
+    if not distinct:
+        return []
+    placeholders = ",".join(["%s"] * len(distinct))
+    #FOR UPDATE holds the rows until commit so single and batch spends cannot interleave
+    cursor.execute(f"SELECT jid, credits, last_reset FROM whatsapp_user WHERE jid IN ({placeholders}) FOR UPDATE",
+                   distinct)
+    balances = {}
+    for row in cursor.fetchall():
+        row = row if isinstance(row, dict) else dict(zip(("jid", "credits", "last_reset"), row))
+        balances[row['jid']] = effective_credits(row['credits'], row['last_reset'], today)
+    results = []
+    for jid in jids:
+        if jid not in balances:
+            results.append(('not_found', 0))
+        elif balances[jid] <= 0:
+            results.append(('no_credits', 0))
+        else:
+            balances[jid] -= 1
+            results.append(('ok', balances[jid]))
+    if balances:
+        cases = " ".join(["WHEN %s THEN %s"] * len(balances))
+        params = [value for pair in balances.items() for value in pair] + [today] + list(balances)
+        cursor.execute(f"UPDATE whatsapp_user SET credits=CASE jid {cases} END, last_reset=%s "
+                       f"WHERE jid IN ({','.join(['%s'] * len(balances))})", params)
+    return results
@@ -0,0 +1,145 @@
+import os
+import time
+import calendar
+import threading
+from datetime import date, datetime
+
+#Seconds between full reloads of the dashboard numbers. Between reloads they are kept up to date incrementally
+DASHBOARD_STATS_TTL = float(os.getenv('DASHBOARD_STATS_TTL', 300))
+
+TOTAL_FIELDS = ('TOTAL_BOOKS', 'TOTAL_EXAMPAPERS', 'NEW_BOOKS', 'NEW_PAPERS', 'TOTAL_BOOK_DOWNLOADS',
+                'TOTAL_PAPER_DOWNLOADS', 'VIEW_BOOK_TOTAL', 'VIEW_PAPER_TOTAL')
+
+
+#--------------------start of the "new uploads" window---------------
+#Same day as CURRENT_DATE() - INTERVAL 1 MONTH in the dashboard_groups query: one calendar month back,
+#clamped to the last day of a shorter month (31 March -> 28 or 29 February)
+def new_since(today=None):
+    today = today or date.today()
+    year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+    return date(year, month, min(today.day, calendar.monthrange(year, month)[1]))
+
+
+def _is_new(upload_date):
+    if upload_date is None:
+        return True
+    if isinstance(upload_date, datetime):
+        upload_date = upload_date.date()
+    return upload_date >= new_since()
+
+
+#--------------------fold the single grouped pass into dashboard numbers---------------
+#rows come from one GROUP BY IS_PAPER, LEVEL, SUBJECT query with TOTAL, NEW_TOTAL, DOWNLOADS and VIEWS per group
+def fold_group_rows(rows):
+    totals = {field: 0 for field in TOTAL_FIELDS}
+    book_counts = {}
+    paper_counts = {}
+    for row in rows:
+        is_paper = row['IS_PAPER'] == 1
+        key = f"{row['LEVEL']}_{row['SUBJECT']}"
+        counts = paper_counts if is_paper else book_counts
+        counts[key] = counts.get(key, 0) + row['TOTAL']
+        totals['TOTAL_EXAMPAPERS' if is_paper else 'TOTAL_BOOKS'] += row['TOTAL']
+        totals['NEW_PAPERS' if is_paper else 'NEW_BOOKS'] += int(row['NEW_TOTAL'] or 0)
+        totals['TOTAL_PAPER_DOWNLOADS' if is_paper else 'TOTAL_BOOK_DOWNLOADS'] += int(row['DOWNLOADS'] or 0)
+        totals['VIEW_PAPER_TOTAL' if is_paper else 'VIEW_BOOK_TOTAL'] += int(row['VIEWS'] or 0)
+    return totals, book_counts, paper_counts
+
+
+#--------------------cached dashboard statistics---------------
+class DashboardStats:
+    def __init__(self, loader, ttl=DASHBOARD_STATS_TTL):
+        #loader returns (totaluploads, book_counts, paper_counts) or None on failure
+        self.loader = loader
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.totaluploads = None
+        self.book_counts = None
+        self.paper_counts = None
+        self.loaded_at = 0.0
+        self.refreshing = False
+        self.loads = 0
+
+    def _expired(self):
+        return self.totaluploads is None or time.monotonic() - self.loaded_at >= self.ttl
+
+    def refresh(self):
+        result = self.loader()
+        if result is None or result[0] is None:
+            return False
+        totaluploads, book_counts, paper_counts = result
+        with self.lock:
+            self.totaluploads = {field: totaluploads.get(field) or 0 for field in TOTAL_FIELDS}
+            self.book_counts = dict(book_counts)
+            self.paper_counts = dict(paper_counts)
+            self.loaded_at = time.monotonic()
+            self.loads += 1
+        return True
+
+    #Only one thread reloads. The others keep serving the previous numbers while it runs
+    def get(self):
+        with self.lock:
+            expired = self._expired()
+            have_data = self.totaluploads is not None
+            should_refresh = expired and not self.refreshing
+            if should_refresh:
+                self.refreshing = True
+        if should_refresh:
+            try:
+                self.refresh()
+            finally:
+                with self.lock:
+                    self.refreshing = False
+        elif expired and not have_data:
+            #First load is still running in another thread; do our own rather than render an empty page
+            self.refresh()
+        with self.lock:
+            if self.totaluploads is None:
+                return None, {}, {}
+            return dict(self.totaluploads), dict(self.book_counts), dict(self.paper_counts)
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = 0.0
+
+    #--------------------incremental updates from upload, delete and the counters---------------
+    def record_upload(self, level, subject, is_paper):
+        with self.lock:
+            if self.totaluploads is None:
+                return
+            key = f"{level}_{subject}"
+            counts = self.paper_counts if is_paper else self.book_counts
+            counts[key] = counts.get(key, 0) + 1
+            self.totaluploads['TOTAL_EXAMPAPERS' if is_paper else 'TOTAL_BOOKS'] += 1
+            self.totaluploads['NEW_PAPERS' if is_paper else 'NEW_BOOKS'] += 1
+
+    def record_delete(self, item):
+        with self.lock:
+            if self.totaluploads is None or not item:
+                return
+            is_paper = item.get('IS_PAPER') == 1
+            key = f"{item.get('LEVEL')}_{item.get('SUBJECT')}"
+            counts = self.paper_counts if is_paper else self.book_counts
+            if counts.get(key, 0) > 0:
+                counts[key] -= 1
+            totals = self.totaluploads
+            totals['TOTAL_EXAMPAPERS' if is_paper else 'TOTAL_BOOKS'] -= 1
+            if _is_new(item.get('UPLOAD_DATE')):
+                totals['NEW_PAPERS' if is_paper else 'NEW_BOOKS'] -= 1
+            totals['VIEW_PAPER_TOTAL' if is_paper else 'VIEW_BOOK_TOTAL'] -= item.get('VIEW_COUNT') or 0
+            totals['TOTAL_PAPER_DOWNLOADS' if is_paper else 'TOTAL_BOOK_DOWNLOADS'] -= item.get('DOWNLOAD_COUNT') or 0
+
+    def record_view(self, is_paper, amount=1):
+        with self.lock:
+            if self.totaluploads is not None:
+                self.totaluploads['VIEW_PAPER_TOTAL' if is_paper else 'VIEW_BOOK_TOTAL'] += amount
+
+    def record_download(self, is_paper, amount=1):
+        with self.lock:
+            if self.totaluploads is not None:
+                self.totaluploads['TOTAL_PAPER_DOWNLOADS' if is_paper else 'TOTAL_BOOK_DOWNLOADS'] += amount
+
+    def stats(self):
+        with self.lock:
+            age = None if self.totaluploads is None else round(time.monotonic() - self.loaded_at, 1)
+        return {"ttl": self.ttl, "age": age, "loads": self.loads}
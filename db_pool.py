@@ -0,0 +1,263 @@
+import time
+import threading
+import mysql.connector
+from mysql.connector import errors
+
+#The C extension is used when DB_USE_PURE=0 and it is installed (mysql-connector-python ships it on most platforms)
+try:
+    import _mysql_connector
+    HAVE_CEXT = True
+except ImportError:
+    HAVE_CEXT = False
+
+
+#--------------------one raw connection and its bookkeeping---------------
+class _PoolEntry:
+    __slots__ = ("cnx", "created_at", "last_used", "statements")
+
+    def __init__(self, cnx):
+        self.cnx = cnx
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        #Prepared cursors by (query name, dictionary). They live and die with the connection
+        self.statements = {}
+
+
+#--------------------connection handed out by the pool---------------
+#close() gives it back to the pool instead of closing the socket
+class PooledConnection:
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get("_entry")
+        if entry is None:
+            raise errors.OperationalError("Connection has been returned to the pool")
+        return getattr(entry.cnx, name)
+
+    @property
+    def pool(self):
+        return self._pool
+
+    #Liveness is checked on checkout, so this does not cost a ping round-trip like the connector's own check
+    def is_connected(self):
+        return self._entry is not None
+
+    #--------------------cached prepared cursor for a registry query---------------
+    #The connector only re-prepares when it is handed a different SQL object, so with one cursor per
+    #query the statement is prepared once per connection and every later call only sends the parameters
+    def statement_cursor(self, name, dictionary=False):
+        entry = self._entry
+        if entry is None:
+            raise errors.OperationalError("Connection has been returned to the pool")
+        key = (name, dictionary)
+        cursor = entry.statements.get(key)
+        if cursor is None:
+            cursor = entry.cnx.cursor(prepared=True, dictionary=dictionary)
+            entry.statements[key] = cursor
+            with self._pool.cond:
+                self._pool.prepared += 1
+        return cursor
+
+    def drop_statement(self, name, dictionary=False):
+        entry = self._entry
+        if entry is None:
+            return
+        cursor = entry.statements.pop((name, dictionary), None)
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    def close(self):
+        entry = self._entry
+        if entry is None:
+            return
+        self._entry = None
+        self._pool._release(entry)
+
+    def discard(self):
+        entry = self._entry
+        if entry is None:
+            return
+        self._entry = None
+        self._pool._discard(entry)
+
+
+#--------------------blocking, self-healing MySQL connection pool---------------
+class ConnectionPool:
+    def __init__(self, db_config, size=5, timeout=10.0, max_lifetime=1800.0, validate_after=30.0, name="mypool"):
+        self.db_config = dict(db_config)
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        #Connections idle longer than this are pinged before being handed out
+        self.validate_after = validate_after
+        self.name = name
+        self.idle = []
+        self.total = 0
+        self.cond = threading.Condition()
+        self.created = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.failures = 0
+        self.recycled = 0
+        self.stale = 0
+        self.prepared = 0
+
+    def _connect(self):
+        try:
+            cnx = mysql.connector.connect(**self.db_config)
+        except Exception:
+            with self.cond:
+                self.failures += 1
+                self.total -= 1
+                self.cond.notify()
+            raise
+        with self.cond:
+            self.created += 1
+        return _PoolEntry(cnx)
+
+    def _close_quietly(self, cnx):
+        try:
+            cnx.close()
+        except Exception:
+            pass
+
+    #Replace connections that are too old or no longer answer a ping
+    def _validate(self, entry):
+        now = time.monotonic()
+        if self.max_lifetime and now - entry.created_at >= self.max_lifetime:
+            self._close_quietly(entry.cnx)
+            with self.cond:
+                self.recycled += 1
+            return None
+        if now - entry.last_used >= self.validate_after:
+            try:
+                entry.cnx.ping(reconnect=False)
+            except Exception:
+                self._close_quietly(entry.cnx)
+                with self.cond:
+                    self.stale += 1
+                return None
+        return entry
+
+    def get_connection(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        waited = False
+        with self.cond:
+            while not self.idle and self.total >= self.size:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise errors.PoolError(f"Pool {self.name} exhausted: no connection free after {timeout}s")
+                if not waited:
+                    waited = True
+                    self.waits += 1
+                self.cond.wait(remaining)
+            if waited:
+                self.wait_time += time.monotonic() - started
+            if self.idle:
+                entry = self.idle.pop()
+            else:
+                self.total += 1
+                entry = None
+        if entry is None:
+            entry = self._connect()
+        else:
+            entry = self._validate(entry)
+            if entry is None:
+                #Keep our slot and open a fresh connection in place of the stale one
+                entry = self._connect()
+        with self.cond:
+            self.checkouts += 1
+        return PooledConnection(self, entry)
+
+    def _release(self, entry):
+        try:
+            if entry.cnx.in_transaction:
+                entry.cnx.rollback()
+        except Exception:
+            self._discard(entry)
+            return
+        entry.last_used = time.monotonic()
+        with self.cond:
+            self.idle.append(entry)
+            self.cond.notify()
+
+    def _discard(self, entry):
+        self._close_quietly(entry.cnx)
+        with self.cond:
+            self.total -= 1
+            self.cond.notify()
+
+    def stats(self):
+        with self.cond:
+            return {"name": self.name, "size": self.size, "open": self.total, "idle": len(self.idle),
+                    "in_use": self.total - len(self.idle), "checkouts": self.checkouts, "created": self.created,
+                    "waits": self.waits, "wait_time": round(self.wait_time, 4), "timeouts": self.timeouts,
+                    "failures": self.failures, "recycled": self.recycled, "stale": self.stale,
+                    "prepared": self.prepared, "use_pure": self.db_config.get("use_pure", True),
+                    "cext_available": HAVE_CEXT}
+
+
+#--------------------read routing over replica pools---------------
+#Round-robin over the replicas that are up. A replica that cannot hand out a connection is skipped for
+#retry_after seconds; with none left the caller reads from the primary instead
+class ReplicaRouter:
+    def __init__(self, replicas, checkout_timeout=2.0, retry_after=30.0):
+        self.replicas = list(replicas)
+        self.checkout_timeout = checkout_timeout
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.down_until = {}
+        self.next = 0
+        self.checkouts = 0
+        self.failovers = 0
+        self.marked_down = 0
+
+    #Returns a replica connection, or None when no replica is configured or reachable
+    def get_connection(self):
+        if not self.replicas:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            start = self.next
+            self.next = (self.next + 1) % len(self.replicas)
+            order = self.replicas[start:] + self.replicas[:start]
+            candidates = [pool for pool in order if self.down_until.get(pool.name, 0.0) <= now]
+        for pool in candidates:
+            try:
+                connection = pool.get_connection(timeout=self.checkout_timeout)
+            except errors.PoolError:
+                #Busy, not broken: try the next one without taking this one out of rotation
+                continue
+            except Exception as err:
+                print(f"Replica {pool.name} unavailable: {err}")
+                self.mark_down(pool)
+                continue
+            with self.lock:
+                self.checkouts += 1
+            return connection
+        with self.lock:
+            self.failovers += 1
+        return None
+
+    def mark_down(self, pool):
+        with self.lock:
+            self.down_until[pool.name] = time.monotonic() + self.retry_after
+            self.marked_down += 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            down = {name for name, until in self.down_until.items() if until > now}
+            counts = {"checkouts": self.checkouts, "failovers": self.failovers, "marked_down": self.marked_down}
+        return {**counts, "replicas": [{**pool.stats(), "host": pool.db_config.get("host"),
+                                        "port": pool.db_config.get("port"), "down": pool.name in down}
+                                       for pool in self.replicas]}
@@ -0,0 +1,247 @@
+import os
+import threading
+from contextlib import contextmanager
+from flask import g, has_request_context, jsonify, request
+from mysql.connector import errors
+from helper_functions import Get_DbConnection, Get_ReadConnection, replica_failed
+from queries import DB_PREPARED
+
+#Errors that mean the connection itself is gone; it is dropped instead of going back to the pool
+CONNECTION_ERRORS = (errors.OperationalError, errors.InterfaceError)
+#After an upload or delete the client reads from the primary for this many seconds, so replication lag
+#never hides its own change. Carried in a short-lived cookie because the next request may hit another worker
+DB_STICKY_SECONDS = int(os.getenv('DB_STICKY_SECONDS', 30))
+PRIMARY_COOKIE = 'db_primary'
+
+
+#--------------------one connection shared by everything a request does---------------
+#Checked out on the first query, released once at teardown. Writes stay in one transaction and are
+#committed together after the view returns, unless a helper needs its result committed straight away
+#Read-only helpers may be served by a replica on a second connection, until the request writes
+#or when the client has just written (see stick_to_primary)
+class DbSession:
+    def __init__(self, connect=None, connect_read=None, sticky=False):
+        self.connect = connect or Get_DbConnection
+        self.connect_read = connect_read or Get_ReadConnection
+        self.connection = None
+        self.read_connection = None
+        self.replica_unavailable = False
+        self.sticky = sticky
+        self.wrote = False
+        self.pending_writes = 0
+        self.failed = False
+        self.queries = 0
+
+    def reads_own_writes(self):
+        return self.sticky or self.wrote
+
+    def uses_primary(self):
+        return self.reads_own_writes() or self.replica_unavailable
+
+    #Primary or replica connection for the next query, checked out on first use
+    def connection_for(self, read_only=False):
+        if read_only and not self.uses_primary():
+            if self.read_connection is None:
+                self.read_connection = self.connect_read()
+                if self.read_connection is None:
+                    #No replica configured or none reachable; the primary serves the rest of the request
+                    self.replica_unavailable = True
+                else:
+                    session_stats.add("replica_checkouts")
+            if self.read_connection is not None:
+                session_stats.add("replica_queries")
+                return self.read_connection
+        if self.connection is None:
+            self.connection = self.connect()
+            session_stats.add("checkouts")
+        return self.connection
+
+    def cursor(self, connection, dictionary=False, statement=None):
+        self.queries += 1
+        if statement and DB_PREPARED:
+            session_stats.add("prepared_queries")
+            return connection.statement_cursor(statement, dictionary)
+        return connection.cursor(dictionary=dictionary)
+
+    def commit(self):
+        if self.connection is None or not self.pending_writes:
+            return
+        try:
+            self.connection.commit()
+        except Exception:
+            self.rollback()
+            raise
+        session_stats.add("commits")
+        session_stats.add("writes", self.pending_writes)
+        self.pending_writes = 0
+
+    def rollback(self):
+        #Earlier writes of this request are lost with the failed one, so the request must not report success
+        if self.pending_writes:
+            self.failed = True
+            self.pending_writes = 0
+        session_stats.add("rollbacks")
+        if self.connection is not None:
+            try:
+                self.connection.rollback()
+            except Exception:
+                self.discard()
+
+    def discard(self, connection=None):
+        if connection is not None and connection is self.read_connection:
+            #A broken replica costs this query, not the request: later reads go to the primary
+            replica_failed(connection)
+            self.read_connection = None
+            self.replica_unavailable = True
+            try:
+                connection.discard()
+            except Exception:
+                pass
+            return
+        if self.pending_writes:
+            self.failed = True
+            self.pending_writes = 0
+        if self.connection is not None:
+            try:
+                self.connection.discard()
+            except Exception:
+                pass
+            self.connection = None
+
+    def close(self):
+        for connection in (self.connection, self.read_connection):
+            if connection is None:
+                continue
+            try:
+                connection.close()
+            except Exception:
+                pass
+        self.connection = None
+        self.read_connection = None
+
+
+class _SessionStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "checkouts": 0, "queries": 0, "commits": 0, "writes": 0, "rollbacks": 0,
+                       "failed_requests": 0, "prepared_queries": 0, "replica_checkouts": 0, "replica_queries": 0,
+                       "sticky_requests": 0}
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counts)
+        checkouts = stats["checkouts"] + stats["replica_checkouts"]
+        stats["queries_per_checkout"] = round(stats["queries"] / checkouts, 2) if checkouts else 0
+        return stats
+
+
+session_stats = _SessionStats()
+
+
+def request_session():
+    session = g.get('db_session')
+    if session is None:
+        sticky = request.cookies.get(PRIMARY_COOKIE) == '1'
+        if sticky:
+            session_stats.add("sticky_requests")
+        session = g.db_session = DbSession(sticky=sticky)
+    return session
+
+
+#Send this client's reads to the primary for the rest of the request and the next DB_STICKY_SECONDS.
+#The cookie is set by commit_request_session
+def stick_to_primary():
+    if has_request_context():
+        request_session().sticky = True
+        g.db_stick_to_primary = True
+
+
+#True when this request must not be answered from anything that may lag behind the primary:
+#replicas, the in-process catalogue or cached pages
+def reads_own_writes():
+    return has_request_context() and request_session().reads_own_writes()
+
+
+#--------------------cursor on the request session---------------
+#Outside a request (upload workers, scripts) the cursor gets a session of its own,
+#which commits its writes and gives the connection back when the block ends.
+#statement names a query from queries.QUERIES; its cursor is the connection's cached prepared one,
+#which is left open for the next call instead of being closed.
+#read_only lets a replica answer; only pass it for reads that can live with replication lag
+@contextmanager
+def db_cursor(dictionary=False, write=False, statement=None, read_only=False):
+    owned = not has_request_context()
+    session = DbSession() if owned else request_session()
+    if write:
+        session.wrote = True
+    connection = None
+    cursor = None
+    cached = bool(statement and DB_PREPARED)
+    try:
+        connection = session.connection_for(read_only and not write)
+        cursor = session.cursor(connection, dictionary=dictionary, statement=statement)
+        yield cursor
+        if cached and cursor.with_rows:
+            #Prepared results are unbuffered; leftovers would block the next query on this connection
+            cursor.fetchall()
+        if write:
+            session.pending_writes += 1
+        if owned:
+            session.commit()
+    except CONNECTION_ERRORS:
+        session.discard(connection)
+        raise
+    except Exception:
+        if cached and connection is not None:
+            connection.drop_statement(statement, dictionary)
+        if write:
+            session.rollback()
+        raise
+    finally:
+        if cursor is not None and not cached:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        if owned:
+            session_stats.add("queries", session.queries)
+            session.close()
+
+
+#Commit what the request has written so far, for helpers whose caller needs to know it stuck
+def commit_session():
+    if has_request_context():
+        request_session().commit()
+
+
+#--------------------request hooks---------------
+#after_request: commit the batched writes while the response can still be turned into an error
+def commit_request_session(response):
+    session = g.get('db_session')
+    if session is None:
+        return response
+    try:
+        session.commit()
+    except Exception as err:
+        print(f"Database commit failed: {err}")
+    if session.failed:
+        session_stats.add("failed_requests")
+        response = jsonify({"error": "Internal server error"})
+        response.status_code = 500
+    elif g.get('db_stick_to_primary'):
+        response.set_cookie(PRIMARY_COOKIE, '1', max_age=DB_STICKY_SECONDS, httponly=True, samesite='Lax')
+    return response
+
+
+#teardown: anything not committed by now is rolled back by the pool when the connection goes back
+def release_request_session(exc=None):
+    session = g.pop('db_session', None)
+    if session is None:
+        return
+    session_stats.add("requests")
+    session_stats.add("queries", session.queries)
+    session.close()
@@ -0,0 +1,98 @@
+import os
+import mimetypes
+from urllib.parse import quote
+from flask import Response, request, send_file
+from http_client import http_get
+import content_cache
+
+#Size of each chunk relayed from cloudinary to the client. Memory per download stays at about one chunk
+CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', 64 * 1024))
+
+#Headers copied from the origin response so resumes and progress bars work on the client
+PASSTHROUGH_HEADERS = ('Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified')
+
+
+class OriginError(Exception):
+    pass
+
+
+#--------------------content disposition header builder---------------
+def attachment_header(download_name):
+    download_name = download_name or "document.pdf"
+    ascii_name = download_name.encode("ascii", "ignore").decode("ascii").replace('"', "") or "document.pdf"
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(download_name)}"
+
+
+#--------------------is this a fresh download or a resume---------------
+def is_first_chunk(status_code, range_header):
+    if status_code == 200:
+        return True
+    return status_code == 206 and bool(range_header) and range_header.replace(" ", "").startswith("bytes=0-")
+
+
+#--------------------open the origin file as a stream------------
+def open_origin(url, range_header=None, if_range=None):
+    headers = {'Accept-Encoding': 'identity'}
+    if range_header:
+        headers['Range'] = range_header
+        if if_range:
+            headers['If-Range'] = if_range
+    upstream = http_get(url, headers=headers, stream=True)
+    if upstream.status_code not in (200, 206, 416):
+        upstream.close()
+        raise OriginError(f"Origin returned {upstream.status_code} for {url}")
+    return upstream
+
+
+#--------------------relay the origin response chunk by chunk------------
+#With a cache_key, a full (non-range) download is also written to the content cache as it goes,
+#so the first byte reaches the client as soon as the origin sends it
+def stream_download(url, download_name, default_mimetype='application/pdf', cache_key=None):
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    upstream = open_origin(url, range_header, if_range)
+    fill = None
+    if cache_key and upstream.status_code == 200 and not range_header:
+        fill = content_cache.begin_fill(cache_key, int(upstream.headers.get('Content-Length') or 0))
+
+    def generate():
+        completed = False
+        try:
+            for chunk in upstream.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    if fill is not None:
+                        fill.write(chunk)
+                    yield chunk
+            completed = True
+        finally:
+            upstream.close()
+            if fill is not None:
+                if completed:
+                    fill.commit()
+                else:
+                    fill.abort()
+
+    content_type = upstream.headers.get('Content-Type') or default_mimetype
+    response = Response(generate(), status=upstream.status_code, content_type=content_type, direct_passthrough=True)
+    for header in PASSTHROUGH_HEADERS:
+        if header in upstream.headers:
+            response.headers[header] = upstream.headers[header]
+    response.headers.setdefault('Accept-Ranges', 'bytes')
+    response.headers['Content-Disposition'] = attachment_header(download_name)
+    response.call_on_close(upstream.close)
+    if fill is not None:
+        #A response that is never iterated must still give the fill lock back
+        response.call_on_close(fill.abort)
+    return response, is_first_chunk(upstream.status_code, range_header)
+
+
+#--------------------serve from the local cache, falling back to the origin stream------------
+def serve_download(url, download_name, cache_key=None):
+    cached_path = content_cache.lookup(cache_key) if cache_key else None
+    if cached_path is None:
+        return stream_download(url, download_name, cache_key=cache_key)
+    mimetype = mimetypes.guess_type(download_name or "")[0] or 'application/pdf'
+    #send_file hands the open file to the server's file wrapper so gunicorn can use sendfile
+    response = send_file(cached_path, mimetype=mimetype, as_attachment=True,
+                         download_name=download_name or "document.pdf", conditional=True)
+    return response, is_first_chunk(response.status_code, request.headers.get('Range'))
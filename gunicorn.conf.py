@@ -0,0 +1,10 @@
+# gunicorn.conf.py (picked up automatically when gunicorn starts in this directory)
+# Only the fork hook lives here; workers, threads and preload stay with the deploy command.
+# Connections are opened lazily, and post_fork makes sure no worker reuses anything the master opened
+# when the app is preloaded.
+
+
+def post_fork(server, worker):
+    from app import reset_after_fork
+    reset_after_fork()
+    server.log.info(f"Worker {worker.pid}: database pool and http session reset after fork")
@@ -1,12 +1,10 @@
 import os
-from flask import Flask 
-import phonenumbers
-import mysql.connector
-from mysql.connector import pooling
+import threading
+from db_pool import ConnectionPool, ReplicaRouter
+from subject_resolver import SubjectResolver
+from validation import normalize_phone, validate_email, validate_username, validate_national_id
 
 from dotenv import load_dotenv
-import re
-from decimal import Decimal,InvalidOperation
 load_dotenv()
 DB_HOST = os.getenv('DB_HOST')
 DB_USER = os.getenv('DB_USER')
@@ -20,17 +18,17 @@ LOCAL_CA_PATH = os.path.join(BASE_DIR, 'ca.pem')
 # For Render deployment (secret files are mounted here)
 RENDER_CA_PATH = '/etc/secrets/ca.pem'
 
-# Choose the right path
+# Choose the right path. Printed by the __main__ connection check, not on every import
 if os.path.exists(RENDER_CA_PATH):
     CA_PATH = RENDER_CA_PATH
-    print(f"Using Render CA certificate: {CA_PATH}")
+    CA_SOURCE = "Render"
 elif os.path.exists(LOCAL_CA_PATH):
     CA_PATH = LOCAL_CA_PATH
-    print(f"Using local CA certificate: {CA_PATH}")
+    CA_SOURCE = "local"
 else:
     # Fallback: try environment variable
     CA_PATH = os.getenv('CA_CERT_PATH', LOCAL_CA_PATH)
-    print(f"Using fallback CA certificate path: {CA_PATH}")
+    CA_SOURCE = "fallback"
 
 
 #Database configurations
@@ -42,14 +40,92 @@ db_config={
         "port":DB_PORT,
         "ssl_verify_cert": False,  # ⚠️ Less secure
         "ssl_disabled": False,
-        "use_pure": True
+        #Set DB_USE_PURE=0 to use the C extension when it is installed
+        "use_pure": os.getenv('DB_USE_PURE', '1') != '0'
 }
 
+#Pool settings. Checkout waits up to DB_POOL_TIMEOUT seconds for a free connection instead of failing at once
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 1800))
+DB_POOL_VALIDATE_AFTER = float(os.getenv('DB_POOL_VALIDATE_AFTER', 30))
+
+#Read replicas as a comma separated list of host or host:port. They use the primary's user, password and database.
+#Only read helpers that can live with replication lag go there; writes and credit reads stay on the primary
+DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+DB_REPLICA_POOL_SIZE = int(os.getenv('DB_REPLICA_POOL_SIZE', DB_POOL_SIZE))
+#A replica that does not answer within these many seconds is skipped and the read goes to the primary
+DB_REPLICA_TIMEOUT = float(os.getenv('DB_REPLICA_TIMEOUT', 2))
+#Seconds a failed replica is left out of rotation
+DB_REPLICA_RETRY = float(os.getenv('DB_REPLICA_RETRY', 30))
+
 #This pooling makes connections so user dont wait 5 minutes 
-db_pool=mysql.connector.pooling.MySQLConnectionPool(pool_name="mypool",pool_size=5,**db_config)
+#The pool is built on first use in each process. Importing this module never touches the database,
+#and a worker forked from a preloaded master starts with its own empty pool
+_db_pool=None
+_db_pool_pid=None
+_db_pool_lock=threading.Lock()
+_db_router=None
+_db_router_pid=None
+
+def get_db_pool():
+    global _db_pool,_db_pool_pid
+    pid=os.getpid()
+    if _db_pool is None or _db_pool_pid!=pid:
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool_pid!=pid:
+                _db_pool=ConnectionPool(db_config,size=DB_POOL_SIZE,timeout=DB_POOL_TIMEOUT,max_lifetime=DB_POOL_MAX_LIFETIME,
+                                        validate_after=DB_POOL_VALIDATE_AFTER,name="mypool")
+                _db_pool_pid=pid
+    return _db_pool
+
+def replica_config(replica):
+    host,_,port=replica.partition(':')
+    config=dict(db_config)
+    config.update(host=host,port=int(port) if port else DB_PORT,connection_timeout=max(int(DB_REPLICA_TIMEOUT),1))
+    return config
+
+def get_db_router():
+    global _db_router,_db_router_pid
+    pid=os.getpid()
+    if _db_router is None or _db_router_pid!=pid:
+        with _db_pool_lock:
+            if _db_router is None or _db_router_pid!=pid:
+                replicas=[ConnectionPool(replica_config(replica),size=DB_REPLICA_POOL_SIZE,timeout=DB_REPLICA_TIMEOUT,
+                                         max_lifetime=DB_POOL_MAX_LIFETIME,validate_after=DB_POOL_VALIDATE_AFTER,
+                                         name=f"replica{number}")
+                          for number,replica in enumerate(DB_REPLICA_HOSTS)]
+                _db_router=ReplicaRouter(replicas,checkout_timeout=DB_REPLICA_TIMEOUT,retry_after=DB_REPLICA_RETRY)
+                _db_router_pid=pid
+    return _db_router
+
+#Called from the gunicorn post_fork hook. Connections inherited from the master are dropped, not closed,
+#because closing them would also end the master's sessions on the same sockets
+def reset_db_pool():
+    global _db_pool,_db_pool_pid,_db_router,_db_router_pid
+    with _db_pool_lock:
+        _db_pool=None
+        _db_pool_pid=None
+        _db_router=None
+        _db_router_pid=None
+
 #Establishing the database connection. Connection helper function
 def Get_DbConnection ():
-    return db_pool.get_connection()
+    return get_db_pool().get_connection()
+
+#Replica connection for a read helper, or None when there is no replica to use and the primary should serve it
+def Get_ReadConnection():
+    return get_db_router().get_connection()
+
+#A replica connection broke mid-query; keep the rest of the traffic off that replica for a while
+def replica_failed(connection):
+    get_db_router().mark_down(connection.pool)
+
+def db_pool_stats():
+    return get_db_pool().stats()
+
+def db_replica_stats():
+    return get_db_router().stats()
 
 #----------------------get book counts function------------------
 # def get_book_counts():
@@ -82,52 +158,27 @@ def Get_DbConnection ():
 #     print(f"{book_count} {value}")
 
 #phone number validation 
+#Always returns a string: the E164 digits without "+", or the error message
 def Phonenumber_validation(phone,country="ZW"):
-    if not phone or str(phone).strip()=="" :
-        return "phone number is requiered"
-    phone="".join(c for c in phone if c.isdigit() or c=="+")
-    try:
-        number=phonenumbers.parse(phone,country)
-        if not phonenumbers.is_valid_number(number):
-            print("Invalid phone number")
-            return "Invalid phone number"
-        return phonenumbers.format_number(number,phonenumbers.PhoneNumberFormat.E164).replace("+","")
-    except phonenumbers.NumberParseException as e:
-        print("Wrong phone number parsing method ",e)
-        return "Wrong phone number parsing method ",e
+    normalized,error=normalize_phone(phone,country)
+    return error if error else normalized
 
 #Email validation function 
 def email_validation(email):
-    if not email or email.strip()=="":
-        return "Email is required"
-    patt=r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-z]{2,3}$'
-    pattern=re.compile(patt)
-    if not bool(re.match(pattern,email)):
-        return "Invalid email entered"
-    return None
+    return validate_email(email)
 
 
 #Username validation
 def validate_text(text):
-    if not text or text.strip()=="":
-        return "Username is required "
-    patt=r'^[a-zA-Z][a-zA-Z0-9]{2,19}$'
-    pattern=re.compile(patt)
-    if not re.match(pattern,text):
-        return "Invalid username has been entered"
-    return None
+    return validate_username(text)
 
 
 
 
 #validating national identity number
 def validate_nationl_id(ID_number):
-    if not ID_number or ID_number.strip()=="":
-        return "ID Number is required"
-    patt = r'^[0-9]{2}([-\s]?)[0-9]{6,7}\1[a-zA-Z]\1[0-9]{2}$'
-    if not bool(re.fullmatch(patt,ID_number)):
-        return "Invalid ID number format entered"
-    return True
+    error=validate_national_id(ID_number)
+    return error if error else True
 
 
     
@@ -141,6 +192,7 @@ if __name__=="__main__":
     #Testing the database connection 
     global_start_time=time.time()
     print(f"THE SCRIPT HAS STARTED NOW {datetime.datetime.now()}",flush=True)
+    print(f"Using {CA_SOURCE} CA certificate path: {CA_PATH}")
     starts=time.time()
     testconn=Get_DbConnection()
     if testconn:
@@ -156,7 +208,7 @@ if __name__=="__main__":
         print(f"THE TOTAL ELAPSED TIME IS {time.time()-global_start_time:.4f}")
     idnumber=input("Enter your ID number and press enter:")
     checkID=validate_nationl_id(idnumber)
-    if checkID is False:
+    if checkID is True:
         print ("valid id number")
     else:
         print (checkID)
@@ -183,7 +235,7 @@ if __name__=="__main__":
 
     email=input("Enter your email and press enter:")
     error=email_validation(email)
-    if  error is True :
+    if  error is not None :
         print(error)
     else:
         print("Correct email has been entered:")
@@ -200,11 +252,6 @@ SUBJCT_MAP={'maths':'Mathematics','math':'Mathematics','mathematics':'Mathematic
             'lits':'Literature in English','literature in english':'Literature in English','frs':'Family and Religious Studies','family and religious studies':'Family and Religious Studies',
             'se':'Software Engineering','software engineering':'Software Enginering','bes':'business studies'
             }
-def normalized_subject(user_input):
-    if not user_input:
-        return None
-    clean_userinput=user_input.lower().strip()
-    return SUBJCT_MAP.get(clean_userinput,user_input.title())
 SUBJECT_IMOJIS={'mathematics':'📐','computer science':'💻','combined science':'🔬','physics':'⚛️','chemistry':'⚗️','mechanics':'⚙️',
                'biology':'🧬','principles of accounts':'💰','crop science':'🌱' ,'software engineering':'👨‍💻','statistics':'📊',
                'geography':'🌍','french':'FR','shona':'📚','history':'📜','english':'📖','literature in shona':'📕','ndebele':'🗣️',
@@ -212,6 +259,11 @@ SUBJECT_IMOJIS={'mathematics':'📐','computer science':'💻','combined science
                'agriculture':'🌾','commerce':'💼' ,'business studies':'💼'
               }
 
+subject_resolver=SubjectResolver(SUBJCT_MAP,SUBJECT_IMOJIS)
+#exact aliases first, then the closest canonical subject when the match is confident enough
+def normalized_subject(user_input):
+    return subject_resolver.normalize(user_input)
+
 #--------------------file name cleaner---------------
 def clean_filename(name: str):
    name=name.replace(" ","_")
@@ -0,0 +1,84 @@
+import os
+import threading
+
+#Outbound http settings. Defaults suit one gunicorn worker talking to res.cloudinary.com
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 4))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 16))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 3))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 0.3))
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+#--------------------build the pooled session---------------
+#requests is imported here so that importing the app does not pay for it until the first download
+def _build_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    retry = Retry(total=HTTP_RETRIES, connect=HTTP_RETRIES, read=HTTP_RETRIES,
+                  backoff_factor=HTTP_BACKOFF, status_forcelist=(502, 503, 504),
+                  allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                          max_retries=retry, pool_block=False)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
+
+
+#One session per process. Sockets are never shared with forked workers
+def get_session():
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+#Called from the gunicorn post_fork hook; the next request builds a fresh session
+def reset_session():
+    global _session, _session_pid
+    with _session_lock:
+        _session = None
+        _session_pid = None
+
+
+#--------------------GET with the default timeouts---------------
+def http_get(url, **kwargs):
+    kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    return get_session().get(url, **kwargs)
+
+
+#--------------------pool hit and miss metrics---------------
+def pool_stats():
+    stats = {"hosts": {}, "requests": 0, "new_connections": 0, "pool_hits": 0}
+    if _session is None or _session_pid != os.getpid():
+        return stats
+    for adapter in set(_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_made = pool.num_requests
+            new_connections = pool.num_connections
+            stats["hosts"][f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "requests": requests_made,
+                "new_connections": new_connections,
+                "pool_hits": max(requests_made - new_connections, 0),
+                "free_slots": pool.pool.qsize() if pool.pool else 0,
+            }
+            stats["requests"] += requests_made
+            stats["new_connections"] += new_connections
+    stats["pool_hits"] = max(stats["requests"] - stats["new_connections"], 0)
+    stats["pool_misses"] = stats["new_connections"]
+    return stats
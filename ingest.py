@@ -0,0 +1,182 @@
+#Bulk catalogue ingest.
+#Reads a directory of files plus a CSV or JSON manifest, uploads the files to Cloudinary through a
+#bounded thread pool and inserts the books rows with batched executemany.
+#
+#Manifest columns: file, subject, level, exambody, season, year
+#Optional columns: type (paper or book, default paper), author, category, language
+#
+#Progress is kept in a JSON file so an interrupted run can be started again and only does what is left:
+#  python ingest.py ./june2024 --manifest ./june2024/manifest.csv
+#  python ingest.py ./june2024 --manifest ./june2024/manifest.csv --dry-run
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from helper_functions import Get_DbConnection
+from upload_jobs import (BOOK_INSERT_SQL, UPLOAD_CHUNK_SIZE, build_fields, build_upload_options,
+                         book_insert_values, default_uploader)
+
+
+#--------------------read the manifest---------------
+def read_manifest(path):
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as manifest_file:
+            rows = json.load(manifest_file)
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as manifest_file:
+            rows = list(csv.DictReader(manifest_file))
+    entries = []
+    for number, row in enumerate(rows, start=1):
+        row = {str(key).strip().lower(): (value.strip() if isinstance(value, str) else value)
+               for key, value in row.items()}
+        if not row.get('file') or not row.get('subject') or not row.get('level'):
+            raise ValueError(f"Manifest row {number} needs file, subject and level: {row}")
+        entries.append(row)
+    return entries
+
+
+def entry_fields(entry):
+    is_paper = 0 if (entry.get('type') or 'paper').lower() == 'book' else 1
+    if is_paper == 1:
+        return build_fields(entry['file'], entry['subject'], entry['level'], is_paper,
+                            author=entry.get('exambody'), exam_season=entry.get('season'), year=entry.get('year'),
+                            category=entry.get('category'), language=entry.get('language'))
+    return build_fields(entry['file'], entry['subject'], entry['level'], is_paper, author=entry.get('author'),
+                        category=entry.get('category'), language=entry.get('language'))
+
+
+#--------------------resumable progress file---------------
+class Progress:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as progress_file:
+                self.entries = json.load(progress_file)
+
+    def get(self, name):
+        with self.lock:
+            return self.entries.get(name)
+
+    def update(self, name, **fields):
+        with self.lock:
+            self.entries.setdefault(name, {}).update(fields)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as progress_file:
+                json.dump(self.entries, progress_file, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+#--------------------upload one file---------------
+def upload_one(uploader, directory, entry, fields):
+    path = os.path.join(directory, entry['file'])
+    result = uploader.upload_large(path, chunk_size=UPLOAD_CHUNK_SIZE, **build_upload_options(fields))
+    return {'public_id': result['public_id'], 'secure_url': result['secure_url'], 'bytes': result['bytes']}
+
+
+#--------------------insert uploaded rows in a few transactions---------------
+def insert_rows(pending, progress, batch_size):
+    inserted = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        connection = None
+        cursor = None
+        try:
+            connection = Get_DbConnection()
+            cursor = connection.cursor()
+            cursor.executemany(BOOK_INSERT_SQL, [book_insert_values(fields, result) for _name, fields, result in batch])
+            connection.commit()
+        except Exception as err:
+            print(f"Database error, batch of {len(batch)} not inserted: {err}")
+            if connection:
+                try:
+                    connection.rollback()
+                except:
+                    pass
+            continue
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except:
+                    pass
+            if connection:
+                try:
+                    connection.close()
+                except:
+                    pass
+        for name, _fields, _result in batch:
+            progress.update(name, status="inserted")
+        inserted += len(batch)
+        print(f"Inserted {inserted}/{len(pending)} rows", flush=True)
+    return inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk upload books and past papers from a manifest")
+    parser.add_argument("directory")
+    parser.add_argument("--manifest", required=True, help="CSV or JSON manifest")
+    parser.add_argument("--workers", type=int, default=4, help="parallel Cloudinary uploads")
+    parser.add_argument("--batch-size", type=int, default=100, help="rows per INSERT transaction")
+    parser.add_argument("--progress", help="progress file (default: <directory>/.ingest_progress.json)")
+    parser.add_argument("--dry-run", action="store_true", help="check the manifest and show what would happen")
+    args = parser.parse_args(argv)
+
+    entries = read_manifest(args.manifest)
+    progress = Progress(args.progress or os.path.join(args.directory, ".ingest_progress.json"))
+    planned = []
+    missing = []
+    for entry in entries:
+        if not os.path.isfile(os.path.join(args.directory, entry['file'])):
+            missing.append(entry['file'])
+            continue
+        planned.append((entry, entry_fields(entry)))
+    for name in missing:
+        print(f"Missing file: {name}")
+
+    todo_upload = [(entry, fields) for entry, fields in planned
+                   if (progress.get(entry['file']) or {}).get('status') not in ('uploaded', 'inserted')]
+    already_uploaded = [(entry['file'], fields, progress.get(entry['file'])['result']) for entry, fields in planned
+                        if (progress.get(entry['file']) or {}).get('status') == 'uploaded']
+    print(f"{len(planned)} files in manifest, {len(todo_upload)} to upload, "
+          f"{len(already_uploaded)} uploaded but not yet inserted, {len(missing)} missing")
+
+    if args.dry_run:
+        for entry, fields in todo_upload:
+            print(f"would upload {entry['file']} -> {fields['filename']} "
+                  f"({fields['level']} {fields['subject']} {'paper' if fields['is_paper'] else 'book'})")
+        return 1 if missing else 0
+
+    uploader = default_uploader()
+    pending = list(already_uploaded)
+    failed = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(upload_one, uploader, args.directory, entry, fields): (entry, fields)
+                   for entry, fields in todo_upload}
+        for done, future in enumerate(as_completed(futures), start=1):
+            entry, fields = futures[future]
+            try:
+                result = future.result()
+            except Exception as err:
+                failed += 1
+                print(f"[{done}/{len(futures)}] upload failed for {entry['file']}: {err}", flush=True)
+                progress.update(entry['file'], status="failed", error=str(err))
+                continue
+            progress.update(entry['file'], status="uploaded", result=result)
+            pending.append((entry['file'], fields, result))
+            print(f"[{done}/{len(futures)}] uploaded {entry['file']}", flush=True)
+    print(f"Uploads finished in {time.perf_counter() - started:.1f}s, {failed} failed")
+
+    inserted = insert_rows(pending, progress, args.batch_size)
+    print(f"Done: {inserted} rows inserted")
+    return 0 if not failed and not missing and inserted == len(pending) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
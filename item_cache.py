@@ -0,0 +1,67 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+#Process-local cache of per-item metadata used by view_pdf, download_pdf and delete
+ITEM_CACHE_SIZE = int(os.getenv('ITEM_CACHE_SIZE', 5000))
+ITEM_CACHE_TTL = float(os.getenv('ITEM_CACHE_TTL', 600))
+#Misses are remembered for less time so a fresh upload shows up quickly on other workers
+ITEM_CACHE_NEGATIVE_TTL = float(os.getenv('ITEM_CACHE_NEGATIVE_TTL', 30))
+
+_MISSING = object()
+
+
+#--------------------bounded LRU read-through cache with TTL and negative entries---------------
+class ItemCache:
+    def __init__(self, loader, maxsize=ITEM_CACHE_SIZE, ttl=ITEM_CACHE_TTL, negative_ttl=ITEM_CACHE_NEGATIVE_TTL):
+        #loader(key) returns a compact row dict, None when the item does not exist, and raises on db errors
+        self.loader = loader
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self.entries.move_to_end(key)
+                    if value is _MISSING:
+                        self.negative_hits += 1
+                        return None
+                    self.hits += 1
+                    return dict(value)
+                del self.entries[key]
+            self.misses += 1
+        value = self.loader(key)
+        self.put(key, value)
+        return dict(value) if value is not None else None
+
+    def put(self, key, value):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, _MISSING if value is None else dict(value))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits,
+                    "negative_hits": self.negative_hits, "misses": self.misses}
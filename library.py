@@ -1,504 +1,221 @@
-import os
 import sys
 from flask import (Flask, session, flash, Response, render_template, redirect, url_for, jsonify,
-                   request, Blueprint, send_from_directory, send_file)
-from helper_functions import Get_DbConnection, normalized_subject, SUBJECT_IMOJIS, clean_filename
+                   request, Blueprint, send_from_directory, make_response)
+from helper_functions import (normalized_subject, SUBJECT_IMOJIS, db_pool_stats, db_replica_stats,
+                              subject_resolver)
+from download_proxy import serve_download
+from http_client import pool_stats
+import content_cache
+from counters import counter_buffer
+from dashboard_stats import DashboardStats, fold_group_rows
+from item_cache import ItemCache, ITEM_CACHE_TTL, ITEM_CACHE_NEGATIVE_TTL
+from catalogue import Catalogue
+from credit_engine import DAILY_CREDITS, effective_credits, refusal_reason, spend_credit, spend_credits_batch
+from batching import BatchError, batch_items, batch_jids
+from upload_jobs import UploadQueue, cloudinary_uploader, build_fields, build_upload_options, book_insert_values
+from search import SEARCH_COLUMNS, build_search_query, search_filters
+from catalogue_version import (CatalogueVersion, DASHBOARD_MAX_AGE, LISTING_MAX_AGE, make_etag,
+                               is_not_modified, set_cache_headers)
+from compression import response_compressor
+from db_session import (db_cursor, commit_session, commit_request_session, release_request_session,
+                        session_stats, stick_to_primary, reads_own_writes)
+from fragment_cache import fragment_cache
+from queries import QUERIES, listing_query
+from pagination import LISTING_PAGE_SIZE, page_limit, decode_cursor, split_page
 from dotenv import load_dotenv
-from werkzeug.utils import secure_filename
 import mysql.connector
 from urllib.parse import quote
-import cloudinary
-import requests
-from io import BytesIO
-from cloudinary import exceptions
-import cloudinary.uploader
-from cloudinary.utils import cloudinary_url
 from mysql.connector.abstracts import MySQLConnectionAbstract, MySQLCursorAbstract
 from datetime import date
 
 load_dotenv()
 library_bp = Blueprint('library_bp', __name__)
-
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
+# Every request shares one lazily checked out connection; writes are committed together after the view.
+# Read helpers pass read_only=True so a replica can answer them while the primary takes the writes
+library_bp.after_app_request(commit_request_session)
+library_bp.teardown_app_request(release_request_session)
 
 # ----------------------Library dashboard helper functions--------------------
+# One grouped pass over books gives every dashboard number and both count maps
 def dashboardhelperfunction():
-    connection = None
-    cursor = None
+    if serve_from_catalogue():
+        return fold_group_rows(catalogue.group_rows())
     try:
-        connection = Get_DbConnection()
-        if not connection:
-            print("Failed to get database connection")
-            return None
-            
-        cursor = connection.cursor(dictionary=True)
-        
-        cursor.execute("""SELECT 
-                        (SELECT COUNT(case when IS_PAPER=0 then 1 END) FROM books) AS TOTAL_BOOKS,
-                        (SELECT COUNT(case when IS_PAPER=1 then 1 END) FROM books) AS TOTAL_EXAMPAPERS,
-                        (SELECT COUNT(*) FROM books WHERE UPLOAD_DATE >=CURRENT_DATE()-INTERVAL 1 MONTH AND IS_PAPER=0) AS NEW_BOOKS,
-                        (SELECT COUNT(*) FROM books WHERE UPLOAD_DATE>=CURRENT_DATE() -INTERVAL 1 MONTH AND IS_PAPER=1) AS NEW_PAPERS,
-                        (SELECT SUM(DOWNLOAD_COUNT) FROM books WHERE IS_PAPER=0) AS TOTAL_BOOK_DOWNLOADS,
-                        (SELECT SUM(DOWNLOAD_COUNT) FROM books WHERE IS_PAPER=1) AS TOTAL_PAPER_DOWNLOADS,
-                        (SELECT SUM(VIEW_COUNT) FROM books WHERE IS_PAPER=0) AS VIEW_BOOK_TOTAL,
-                        (SELECT SUM(VIEW_COUNT) FROM books WHERE IS_PAPER=1) AS VIEW_PAPER_TOTAL
-                        FROM DUAL"""
-                       )
-        totaluploads = cursor.fetchone()
-        return totaluploads
+        with db_cursor(dictionary=True, statement='dashboard_groups', read_only=True) as cursor:
+            cursor.execute(QUERIES['dashboard_groups'])
+            return fold_group_rows(cursor.fetchall())
     except mysql.connector.Error as err:
         print(f"Error : {err}")
         return None
     except Exception as e:
         print(f"Error : {e}")
         return None
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
 
 # --------get books from the database by subject and level
-def get_book_by_subject_and_level(level, subject):
-    connection = None
-    cursor = None
+# Keyset pagination on (UPLOAD_DATE, BOOK_ID); returns (books, next_cursor)
+def get_book_by_subject_and_level(level, subject, limit=LISTING_PAGE_SIZE, after=None):
+    if serve_from_catalogue():
+        return split_page(catalogue.page(False, level, subject, limit + 1, after), limit)
     try:
-        connection = Get_DbConnection()
-        if not connection:
-            return []
-            
-        cursor = connection.cursor(dictionary=True)
-        sql = """SELECT BOOK_ID,TITLE,AUTHOR,DESCRIPTION,FILE_SIZE,FORMAT,BOOK_YEAR,YEAR(UPLOAD_DATE) AS UYEAR
-                FROM books WHERE SUBJECT=%s AND LEVEL=%s AND IS_PAPER=0 ORDER BY UPLOAD_DATE DESC
-            """
-        cursor.execute(sql, (subject, level))
-        books = cursor.fetchall()
-        return books
+        name, params = listing_query(False, level, subject, limit + 1, after)
+        with db_cursor(dictionary=True, statement=name, read_only=True) as cursor:
+            cursor.execute(QUERIES[name], params)
+            return split_page(cursor.fetchall(), limit)
     except Exception as err:
         print(f"Error occured: {err}")
-        return []
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
+        return [], None
 
 # -----------get papers from database by subject and level
-def get_papers_by_subject_and_level(level, subject):
-    connection = None
-    cursor = None
+def get_papers_by_subject_and_level(level, subject, limit=LISTING_PAGE_SIZE, after=None):
+    if serve_from_catalogue():
+        return split_page(catalogue.page(True, level, subject, limit + 1, after), limit)
     try:
-        connection = Get_DbConnection()
-        if not connection:
-            return []
-            
-        cursor = connection.cursor(dictionary=True)
-        sql = """SELECT BOOK_ID,TITLE,AUTHOR,DESCRIPTION,FILE_SIZE,BOOK_YEAR,EXAMINATION_SEASON,FORMAT,YEAR(UPLOAD_DATE) AS UYEAR,
-                coalesce(VIEW_COUNT,0) AS VIEWS,COALESCE(DOWNLOAD_COUNT,0) AS DOWNLOADS
-                FROM books WHERE SUBJECT=%s AND LEVEL=%s AND IS_PAPER=1 ORDER BY UPLOAD_DATE DESC
-            """
-        cursor.execute(sql, (subject, level))
-        papers = cursor.fetchall()
-        return papers
+        name, params = listing_query(True, level, subject, limit + 1, after)
+        with db_cursor(dictionary=True, statement=name, read_only=True) as cursor:
+            cursor.execute(QUERIES[name], params)
+            return split_page(cursor.fetchall(), limit)
     except Exception as err:
         print(f"Error occured: {err}")
-        return []
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
-
-# --------Get books by id-------
-def get_book_by_book_id(book_id):
-    connection = None
-    cursor = None
+        return [], None
+
+# --------Get a book or paper by id in one lookup-------
+# Returns (item, item_type) where item_type is 'paper' or 'book', or (None, None) when the id does not exist.
+# Errors propagate so the item cache never stores a failed lookup as a miss.
+# The plain lookup may come from a replica; the delete route's lookup reads the primary
+def get_item_by_id(book_id, statement='item_by_id'):
+    with db_cursor(dictionary=True, statement=statement, read_only=statement == 'item_by_id') as cursor:
+        cursor.execute(QUERIES[statement], (book_id,))
+        rows = cursor.fetchall()
+    item = rows[0] if rows else None
+    if item is None:
+        return None, None
+    return item, 'paper' if item.get('IS_PAPER') == 1 else 'book'
+
+
+# ---------------in-process copy of the books table---------------
+# The delete log position is read before the rows, so a delete racing the full read is replayed by the next poll
+def load_catalogue():
+    with db_cursor(dictionary=True, statement='catalogue_log_head', read_only=True) as cursor:
+        cursor.execute(QUERIES['catalogue_log_head'])
+        rows = cursor.fetchall()
+    head = rows[0] if rows else {}
+    with db_cursor(read_only=True) as cursor:
+        cursor.execute(QUERIES['catalogue_rows'])
+        return cursor.fetchall(), head.get('LOG_ID') or 0, head.get('LAST_DELETE')
+
+
+def load_catalogue_changes(after_id, after_log_id):
+    with db_cursor(statement='catalogue_rows_after', read_only=True) as cursor:
+        cursor.execute(QUERIES['catalogue_rows_after'], (after_id,))
+        rows = cursor.fetchall()
+    with db_cursor(statement='catalogue_deletes_after', read_only=True) as cursor:
+        cursor.execute(QUERIES['catalogue_deletes_after'], (after_log_id,))
+        return rows, cursor.fetchall()
+
+
+# Deletes seen in the delete log also drop the item from this worker's item cache
+catalogue = Catalogue(load_catalogue, load_catalogue_changes, on_delete=lambda book_id: item_cache.invalidate(book_id))
+
+
+# A client that has just uploaded or deleted is answered from the primary until its change has had time to spread
+def serve_from_catalogue():
+    return not reads_own_writes() and catalogue.ready()
+
+
+# The catalogue answers for the rows it holds; an id it has not polled yet (a fresh upload on another worker)
+# still goes to the database
+def lookup_item(book_id):
+    if serve_from_catalogue():
+        item = catalogue.item(book_id)
+        if item is not None:
+            return item
+    return get_item_by_id(book_id)[0]
+
+
+# Other workers learn about a delete from the catalogue's delete log poll. Without the catalogue nothing
+# tells them, so entries expire as quickly as cached misses do
+item_cache = ItemCache(lookup_item, ttl=ITEM_CACHE_TTL if catalogue.enabled else ITEM_CACHE_NEGATIVE_TTL)
+
+
+# ---------------catalogue version stamp behind the listing and dashboard ETags---------------
+# Taken from the in-process catalogue when it is loaded, so the ETags follow the copy the listings are built from
+def get_catalogue_stamp():
+    if serve_from_catalogue():
+        return catalogue.stamp()
     try:
-        connection = Get_DbConnection()
-        if not connection:
-            return None
-            
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM books WHERE BOOK_ID=%s AND IS_PAPER=0", (book_id,))
-        book = cursor.fetchone()
-        return book
+        with db_cursor(dictionary=True, statement='catalogue_stamp', read_only=True) as cursor:
+            cursor.execute(QUERIES['catalogue_stamp'])
+            rows = cursor.fetchall()
+            return rows[0] if rows else None
     except Exception as err:
         print(f"Error occured: {err}")
         return None
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
-
-# ---------get paper by id ------
-def get_paper_by_id(paper_id):
-    connection = None
-    cursor = None
-    try:
-        connection = Get_DbConnection()
-        if not connection:
-            return None
-            
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM books WHERE BOOK_ID=%s AND IS_PAPER=1", (paper_id,))
-        paper = cursor.fetchone()
-        return paper
-    except Exception as err:
-        print(f"Error occured: {err}")
-        return None
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
+
+
+catalogue_version = CatalogueVersion(get_catalogue_stamp)
 
 # -----------------increment book Views helper fuction ----------
 def increment_book_views(book_id):
-    connection = None
-    cursor = None
-    try:
-        connection = Get_DbConnection()
-        if not connection:
-            print("Failed to get connection for incrementing book views")
-            return False
-            
-        cursor = connection.cursor()
-        cursor.execute("UPDATE books SET VIEW_COUNT=COALESCE(VIEW_COUNT,0)+1 WHERE BOOK_ID=%s AND IS_PAPER=0", (book_id,))
-        connection.commit()
-        return True
-    except Exception as err:
-        print(f"Error occured: {err}")
-        if connection and connection.is_connected():
-            try:
-                connection.rollback()
-            except:
-                pass
-        return False
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
+    dashboard_cache.record_view(is_paper=False)
+    catalogue.record_view(book_id)
+    return counter_buffer.add('book_views', book_id)
 
 # --------------increment paper views helper function-------------
 def increment_paper_views(book_id):
-    connection = None
-    cursor = None
-    try:
-        connection = Get_DbConnection()
-        if not connection:
-            print("Failed to get connection for incrementing paper views")
-            return False
-            
-        cursor = connection.cursor()
-        cursor.execute("UPDATE books SET VIEW_COUNT=COALESCE(VIEW_COUNT,0)+1 WHERE BOOK_ID=%s AND IS_PAPER=1", (book_id,))
-        connection.commit()
-        return True
-    except Exception as err:
-        print(f"Error Occured: {err}")
-        if connection and connection.is_connected():
-            try:
-                connection.rollback()
-            except:
-                pass
-        return False
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
+    dashboard_cache.record_view(is_paper=True)
+    catalogue.record_view(book_id)
+    return counter_buffer.add('book_views', book_id)
 
 # ------------increment book download count helper functions-----------
 def increment_book_downloads(book_id):
-    connection = None
-    cursor = None
-    try:
-        connection = Get_DbConnection()
-        if not connection:
-            print("Failed to get connection for incrementing book downloads")
-            return False
-            
-        cursor = connection.cursor()
-        cursor.execute("UPDATE books SET DOWNLOAD_COUNT=COALESCE(DOWNLOAD_COUNT,0)+1 WHERE BOOK_ID=%s AND IS_PAPER=0", (book_id,))
-        connection.commit()
-        return True
-    except Exception as err:
-        print(f"Error occured: {err}")
-        if connection and connection.is_connected():
-            try:
-                connection.rollback()
-            except:
-                pass
-        return False
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
+    dashboard_cache.record_download(is_paper=False)
+    catalogue.record_download(book_id)
+    return counter_buffer.add('book_downloads', book_id)
 
 # -----------increment paper download count helper function -----------
 def increment_paper_downloads(book_id):
-    connection = None
-    cursor = None
-    try:
-        connection = Get_DbConnection()
-        if not connection:
-            print("Failed to get connection for incrementing paper downloads")
-            return False
-            
-        cursor = connection.cursor()
-        cursor.execute("UPDATE books SET DOWNLOAD_COUNT=COALESCE(DOWNLOAD_COUNT,0)+1 WHERE BOOK_ID=%s AND IS_PAPER=1", (book_id,))
-        connection.commit()
-        return True
-    except Exception as err:
-        print(f"Error occured: {err}")
-        if connection and connection.is_connected():
-            try:
-                connection.rollback()
-            except:
-                pass
-        return False
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
-
-# --------get book count by level and subject ---------
-def get_book_count():
-    connection = None
-    cursor = None
-    bookcounts = {}
-    try:
-        connection = Get_DbConnection()
-        if not connection:
-            return {}
-            
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT LEVEL,SUBJECT,COUNT(*) AS TOTAL FROM books WHERE IS_PAPER=0 group by LEVEL, SUBJECT")
-        result = cursor.fetchall()
-        for row in result:
-            key = f"{row['LEVEL']}_{row['SUBJECT']}"
-            bookcounts[key] = row["TOTAL"]
-        return bookcounts
-    except mysql.connector.Error as err:
-        print(f"Database error: {err}")
-        return {}
-    except Exception as e:
-        print(f"Error: {e}")
-        return {}
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
-
-# ----------get papers count per each subject
-def get_paper_count():
-    connection = None
-    cursor = None
-    paper_counts = {}
-    try:
-        connection = Get_DbConnection()
-        if not connection:
-            return {}
-            
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT LEVEL, SUBJECT, COUNT(*) as TOTAL FROM books where IS_PAPER=1 group by LEVEL, SUBJECT")
-        results = cursor.fetchall()
-        for row in results:
-            key = f"{row['LEVEL']}_{row['SUBJECT']}"
-            paper_counts[key] = row['TOTAL']
-        return paper_counts
-    except mysql.connector.Error as err:
-        print(f"Database error occured: {err}")
-        return {}
-    except Exception as e:
-        print(f"Error: {e}")
-        return {}
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
-
-# ------------------Delete book by Book_id------------
-def delete_book_by_book_id(book_id):
-    connection = None
-    cursor = None
-    try:
-        connection = Get_DbConnection()
-        if not connection:
-            return False
-            
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM books WHERE BOOK_ID=%s AND IS_PAPER=0", (book_id,))
-        connection.commit()
-        return True
-    except Exception as err:
-        print(f"Error occured: {err}")
-        if connection and connection.is_connected():
-            try:
-                connection.rollback()
-            except:
-                pass
-        return False
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
-
-# -------------------delete paper using book_id
-def delete_paper_by_book_id(book_id):
-    connection = None
-    cursor = None
+    dashboard_cache.record_download(is_paper=True)
+    catalogue.record_download(book_id)
+    return counter_buffer.add('book_downloads', book_id)
+
+# ------------------Delete a book or paper by Book_id------------
+def delete_item_by_id(book_id):
     try:
-        connection = Get_DbConnection()
-        if not connection:
-            return False
-            
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM books WHERE BOOK_ID=%s AND IS_PAPER=1", (book_id,))
-        connection.commit()
+        with db_cursor(write=True, statement='delete_book') as cursor:
+            cursor.execute(QUERIES['delete_book'], (book_id,))
+        # Logged in the same transaction; every worker's catalogue drops the row on its next poll
+        with db_cursor(write=True, statement='log_delete') as cursor:
+            cursor.execute(QUERIES['log_delete'], (book_id,))
+        # The caller reports the outcome to the user, so this write is not left to the end of the request
+        commit_session()
         return True
     except Exception as err:
         print(f"Error occured: {err}")
-        if connection and connection.is_connected():
-            try:
-                connection.rollback()
-            except:
-                pass
         return False
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
+
+
+# ------------------cached dashboard statistics------------
+dashboard_cache = DashboardStats(dashboardhelperfunction)
 
 
 # FIX 1: Added credits and last_reset to SELECT, fixed placeholder syntax, fixed table name
 @library_bp.route("/user/<jid>", methods=["GET"])
 def get_user(jid):
-    connection = None
-    cursor = None
     try:
-        connection = Get_DbConnection()
-        cursor = connection.cursor(dictionary=True)
-        # FIX: Was only selecting 'username' — added credits and last_reset
-        cursor.execute('SELECT username, credits, last_reset FROM whatsapp_user WHERE jid=%s', (jid,))
-        user = cursor.fetchone()
+        with db_cursor(dictionary=True, statement='user_by_jid') as cursor:
+            # FIX: Was only selecting 'username' — added credits and last_reset
+            cursor.execute(QUERIES['user_by_jid'], (jid,))
+            rows = cursor.fetchall()
+        user = rows[0] if rows else None
         if not user:
             return jsonify({"exists": False}), 404
-        # Reset user credits daily
-        today = date.today()
-        if user['last_reset'] != today:
-            # FIX: Was 'whatsapp_users' (wrong table) and used bare % instead of %s
-            cursor.execute(
-                "UPDATE whatsapp_user SET credits=5, last_reset=%s WHERE jid=%s",
-                (today, jid)
-            )
-            connection.commit()
-            user['credits'] = 5
+        # Daily reset is computed here and only written when a credit is spent, so a read stays a read
+        user['credits'] = effective_credits(user['credits'], user['last_reset'])
         return jsonify({**user, "exists": True})
     except Exception as e:
         print(f"Error Occured: {e}")
         # FIX: Was missing a return on exception — Flask would crash with no response
         return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
 
 
 @library_bp.route("/user/register", methods=['POST'])
@@ -508,69 +225,27 @@ def register_user():
     # FIX: Added input validation — missing jid would cause a crash
     if not jid:
         return jsonify({"error": "jid is required"}), 400
-    connection = None
-    cursor = None
     try:
-        connection = Get_DbConnection()
-        cursor = connection.cursor(dictionary=True)
-        sql = """INSERT INTO whatsapp_user(jid, username, datejoined, last_reset, credits,
-        download_count) VALUES(%s,%s,now(),%s,5,0)"""
-        values = (jid, data.get('username', ''), date.today())
-        cursor.execute(sql, values)
-        connection.commit()
+        # Committed with the rest of the request's writes once the view returns
+        with db_cursor(write=True, statement='register_user') as cursor:
+            values = (jid, data.get('username', ''), date.today(), DAILY_CREDITS)
+            cursor.execute(QUERIES['register_user'], values)
         return jsonify({"message": "registered"}), 201
     except Exception as e:
         print(f"Error occured: {e}")
         # FIX: Was missing a return on exception
         return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
 
 
 @library_bp.route("/user/download", methods=["POST"])
 def user_increment_download():
-    connection = None
-    cursor = None
     jid = request.json.get('jid')
     # FIX: Added input validation
     if not jid:
         return jsonify({"error": "jid is required"}), 400
-    try:
-        connection = Get_DbConnection()
-        # FIX: Was 'dictinary=True' (typo) — caused a TypeError
-        cursor = connection.cursor(dictionary=True)
-        # FIX: Was bare % instead of %s
-        cursor.execute(
-            "UPDATE whatsapp_user SET download_count=COALESCE(download_count,0)+1 WHERE jid=%s",
-            (jid,)
-        )
-        connection.commit()
-        return jsonify({"message": "ok"})
-    except Exception as e:
-        print(f"Error Occured: {e}")
-        # FIX: Was missing a return on exception
-        return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        # FIX: Was 'connection.is_connected' without () — never actually called the method
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
+    # Buffered and written in batches by the counter flusher
+    counter_buffer.add('user_downloads', jid)
+    return jsonify({"message": "ok"})
 
 
 @library_bp.route("/user/use-credit", methods=['POST'])
@@ -579,177 +254,244 @@ def use_credit():
     # FIX: Added input validation
     if not jid:
         return jsonify({"error": "jid is required"}), 400
-    connection = None
-    cursor = None
     try:
-        connection = Get_DbConnection()
-        cursor = connection.cursor(dictionary=True)
-        # FIX: Was bare % instead of %s, and had a trailing space in the query
-        cursor.execute("SELECT credits, last_reset FROM whatsapp_user WHERE jid=%s", (jid,))
-        user = cursor.fetchone()
-        if not user:
+        with db_cursor(dictionary=True, write=True, statement='use_credit') as cursor:
+            # Reset, check and decrement happen in one conditional UPDATE
+            status, remaining = spend_credit(cursor, jid)
+        if status == 'refused':
+            with db_cursor(dictionary=True, statement='user_exists') as cursor:
+                status = refusal_reason(cursor, jid)
+        if status == 'not_found':
             print("User not Found")
             return jsonify({"error": "user not found"}), 404
-        today = date.today()
-        if user['last_reset'] != today:
-            # FIX: Was 'UPDATE whstsapp SET last_reset=5' — wrong table name and set wrong value
-            cursor.execute(
-                "UPDATE whatsapp_user SET credits=5, last_reset=%s WHERE jid=%s",
-                (today, jid)
-            )
-            connection.commit()
-            user['credits'] = 5
-        if user['credits'] <= 0:
+        if status == 'no_credits':
             # FIX: Was returning success=True when credits are 0 — now correctly returns an error
             return jsonify({"success": False, "credits": 0, "error": "No credits remaining"}), 403
-        # FIX: Was bare % instead of %s
-        cursor.execute("UPDATE whatsapp_user SET credits=credits-1 WHERE jid=%s", (jid,))
-        connection.commit()
-        return jsonify({"success": True, "credits": user["credits"] - 1})
+        return jsonify({"success": True, "credits": remaining})
     except Exception as e:
         print(f"Error Occured: {e}")
         # FIX: Was missing a return on exception
         return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
+
+
+# ----------------batch endpoints for the WhatsApp bot----------------
+@library_bp.route("/user/batch", methods=["POST"])
+def get_users_batch():
+    try:
+        jids = batch_jids(request.get_json(silent=True))
+    except BatchError as err:
+        return jsonify({"error": str(err)}), 400
+    try:
+        distinct = list(dict.fromkeys(jids))
+        placeholders = ",".join(["%s"] * len(distinct))
+        with db_cursor(dictionary=True) as cursor:
+            cursor.execute(f"SELECT jid, username, credits, last_reset FROM whatsapp_user WHERE jid IN ({placeholders})",
+                           distinct)
+            users = {row['jid']: row for row in cursor.fetchall()}
+        results = []
+        for jid in jids:
+            user = users.get(jid)
+            if user is None:
+                results.append({"jid": jid, "exists": False})
+                continue
+            results.append({**user, "credits": effective_credits(user['credits'], user['last_reset']), "exists": True})
+        return jsonify({"results": results})
+    except Exception as e:
+        print(f"Error Occured: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@library_bp.route("/user/register/batch", methods=["POST"])
+def register_users_batch():
+    try:
+        users = batch_items(request.get_json(silent=True), 'users')
+    except BatchError as err:
+        return jsonify({"error": str(err)}), 400
+    wanted = {}
+    results = []
+    for user in users:
+        jid = user.get('jid') if isinstance(user, dict) else None
+        if not jid:
+            results.append({"jid": jid, "error": "jid is required"})
+            continue
+        wanted.setdefault(jid, user.get('username', ''))
+        results.append({"jid": jid})
+    if not wanted:
+        return jsonify({"results": results})
+    try:
+        with db_cursor(write=True) as cursor:
+            placeholders = ",".join(["%s"] * len(wanted))
+            cursor.execute(f"SELECT jid FROM whatsapp_user WHERE jid IN ({placeholders})", list(wanted))
+            existing = {row[0] for row in cursor.fetchall()}
+            new_users = [(jid, username, date.today(), DAILY_CREDITS) for jid, username in wanted.items()
+                         if jid not in existing]
+            if new_users:
+                # One multi-row insert; a jid registered concurrently is left as it is
+                values_sql = ",".join(["(%s,%s,now(),%s,%s,0)"] * len(new_users))
+                cursor.execute(f"""INSERT INTO whatsapp_user(jid, username, datejoined, last_reset, credits,
+                    download_count) VALUES {values_sql} ON DUPLICATE KEY UPDATE jid=jid""",
+                               [value for row in new_users for value in row])
+        for result in results:
+            if "error" not in result:
+                result["message"] = "exists" if result["jid"] in existing else "registered"
+        return jsonify({"results": results}), 201 if new_users else 200
+    except Exception as e:
+        print(f"Error occured: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@library_bp.route("/user/download/batch", methods=["POST"])
+def user_increment_download_batch():
+    try:
+        jids = batch_jids(request.get_json(silent=True))
+    except BatchError as err:
+        return jsonify({"error": str(err)}), 400
+    results = []
+    for jid in jids:
+        counter_buffer.add('user_downloads', jid)
+        results.append({"jid": jid, "message": "ok"})
+    return jsonify({"results": results})
+
+
+@library_bp.route("/user/use-credit/batch", methods=["POST"])
+def use_credit_batch():
+    try:
+        jids = batch_jids(request.get_json(silent=True))
+    except BatchError as err:
+        return jsonify({"error": str(err)}), 400
+    try:
+        with db_cursor(dictionary=True, write=True) as cursor:
+            outcomes = spend_credits_batch(cursor, jids)
+        results = []
+        for jid, (status, remaining) in zip(jids, outcomes):
+            if status == 'ok':
+                results.append({"jid": jid, "success": True, "credits": remaining})
+            elif status == 'no_credits':
+                results.append({"jid": jid, "success": False, "credits": 0, "error": "No credits remaining"})
+            else:
+                results.append({"jid": jid, "success": False, "error": "user not found"})
+        return jsonify({"results": results})
+    except Exception as e:
+        print(f"Error Occured: {e}")
+        return jsonify({"error": "Internal server error"}), 500
 
 
 @library_bp.route("/")
 def library_dashboard():
-    book_counts = get_book_count()
-    paper_counts = get_paper_count()
-    totaluploads = dashboardhelperfunction()
-    return render_template('library.html', totaluploads=totaluploads, SUBJECT_IMOJIS=SUBJECT_IMOJIS,
-                           book_counts=book_counts, paper_counts=paper_counts)
+    # The numbers come from the in-process dashboard cache, so the ETag costs no query; a match skips the render
+    totaluploads, book_counts, paper_counts = dashboard_cache.get()
+    # A page without stats (database down) or with this client's flash messages must not be stored by caches
+    cacheable = totaluploads is not None and not has_session_state()
+    etag = make_etag('dashboard', sorted(totaluploads.items()), sorted(book_counts.items()),
+                     sorted(paper_counts.items())) if cacheable else None
+    if etag and is_not_modified(request, etag):
+        return set_cache_headers(make_response('', 304), etag, max_age=DASHBOARD_MAX_AGE)
+    response = make_response(render_template('library.html', totaluploads=totaluploads, SUBJECT_IMOJIS=SUBJECT_IMOJIS,
+                                             subject_grid=subject_grid_html(book_counts, paper_counts)))
+    if etag:
+        set_cache_headers(response, etag, max_age=DASHBOARD_MAX_AGE)
+    return response
+
+
+# ---------------subject folder grid, rendered once per set of counts---------------
+# The grid holds ~100 url_for links that never change; only the counts do, and they change on upload or delete
+def subject_grid_html(book_counts, paper_counts):
+    key = ('subject_grid', make_etag(sorted(book_counts.items()), sorted(paper_counts.items())))
+    return fragment_cache.get_or_render(key, lambda: render_template('subject_grid.html', book_counts=book_counts,
+                                                                     paper_counts=paper_counts))
+
+
+# ---------------store an uploaded file in the books table---------------
+# Runs in the upload worker once Cloudinary has the file. Returns the new BOOK_ID
+def save_uploaded_book(fields, upload_result):
+    print(f"The uploaded book public id is {upload_result['public_id']}")
+    try:
+        # No request here, so the cursor has its own session and the insert is committed when the block ends
+        with db_cursor(write=True, statement='insert_book') as cursor:
+            values = book_insert_values(fields, upload_result)
+            cursor.execute(QUERIES['insert_book'], values)
+            book_id = cursor.lastrowid
+    except Exception as err:
+        print(f"Database error: {err}")
+        raise
+    item_cache.invalidate(book_id)
+    catalogue.invalidate()
+    catalogue_version.invalidate()
+    dashboard_cache.record_upload(fields['level'], fields['subject'], fields['is_paper'])
+    print(f"Book successfully added {values}")
+    return book_id
+
+
+upload_queue = UploadQueue(save_uploaded_book)
 
 
 # Route for uploading a new file
+# The file is spooled to disk and uploaded by a background worker; the request returns straight away
 @library_bp.route("/upload", methods=["GET", "POST"])
 def upload():
     if request.method == "POST":
-        connection = None
-        cursor = None
-
-        subject = request.form.get('subject')
+        subject = normalized_subject(request.form.get('subject'))
         level = request.form.get('level')
         language = request.form.get('language')
         category = request.form.get('category')
         book_upload = request.files.get('Upload')
+        wants_json = 'application/json' in request.headers.get("Accept", "")
+        if not book_upload or not book_upload.filename:
+            if wants_json:
+                return jsonify({"error": "No file uploaded"}), 400
+            flash("No file uploaded", "error")
+            return redirect(url_for('library_bp.library_dashboard'))
         is_paper = 1 if request.form.get('uploadType') == 'paper' else 0
-        cleaned_name = clean_filename(book_upload.filename)
-        secured_bookname = secure_filename(cleaned_name)
-        year = None
-        exam_season = None
-
         if is_paper == 1:
-            year = request.form.get('year')
-            author = request.form.get('exambody')
-            exam_season = request.form.get('examseason')
-            description = f"This is a {subject} question paper for the {author} {level} level {exam_season} {year} session "
+            fields = build_fields(book_upload.filename, subject, level, is_paper,
+                                  author=request.form.get('exambody'), exam_season=request.form.get('examseason'),
+                                  year=request.form.get('year'), category=category, language=language)
         else:
-            author = request.form.get('author')
-            description = f"{secured_bookname} is an {level} {subject} book written by {author if author.strip() else 'Unknown Author'} "
-
-        file_type = book_upload.filename.rsplit(".", 1)[1].upper() if "." in book_upload.filename else "PDF"
-
-        # Upload to Cloudinary
-        try:
-            upload_result = cloudinary.uploader.upload(
-                book_upload,
-                folder="library_books",
-                resource_type="auto",
-                public_id=secured_bookname.rsplit(".", 1)[0],
-                overwrite=False,
-                unique_filename=True,
-                tags=[category, level, language]
-            )
-
-            cloudinary_url = upload_result['secure_url']
-            public_id = upload_result['public_id']
-            book_size = round(upload_result['bytes'] / (1024 * 1024), 2)
-            print(f"The uploaded book public id is {public_id}")
-
-        except cloudinary.exceptions.Error as cloud_err:
-            print(f"Cloudinary error: {cloud_err}")
-            flash(f"File upload error: {cloud_err}", "error")
-            return redirect(url_for('library_bp.library_dashboard'))
-
-        # Database insert
+            fields = build_fields(book_upload.filename, subject, level, is_paper, author=request.form.get('author'),
+                                  category=category, language=language)
+        secured_bookname = fields['filename']
+        upload_options = build_upload_options(fields)
         try:
-            connection = Get_DbConnection()
-            if not connection:
-                flash("Database connection failed. Please try again.", "error")
-                return redirect(url_for('library_bp.library_dashboard'))
-
-            cursor = connection.cursor()
-            sql = """INSERT INTO books (TITLE,AUTHOR,DESCRIPTION,SUBJECT,CATEGORY,
-                LEVEL,FORMAT,CLOUDINARY_PUBLIC_ID,LANGUAGE,FILENAME,FILE_PATH,FILE_SIZE,BOOK_YEAR,
-                UPLOAD_DATE,IS_PAPER,EXAMINATION_SEASON) VALUES(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,now(),%s,%s) """
-
-            values = (secured_bookname, author, description, normalized_subject(subject), category, level,
-                      file_type, public_id, language, secured_bookname, cloudinary_url, book_size, year, is_paper, exam_season)
-
-            cursor.execute(sql, values)
-            connection.commit()
-
-            print(f"Book successfully added {values}")
-            flash(f"{'Paper' if is_paper == 1 else 'Book'} {secured_bookname} uploaded successfully", "success")
-            return redirect(url_for('library_bp.library_dashboard'))
-
+            job_id = upload_queue.submit(book_upload, fields, upload_options)
         except Exception as err:
-            print(f"Database error: {err}")
-            flash(f"Database error: {err}", "error")
-            if connection and connection.is_connected():
-                try:
-                    connection.rollback()
-                except Exception as rollback_err:
-                    print(f"Rollback Error: {rollback_err}")
+            print(f"Upload spool error: {err}")
+            if wants_json:
+                return jsonify({"error": "Upload could not be queued"}), 500
+            flash(f"File upload error: {err}", "error")
             return redirect(url_for('library_bp.library_dashboard'))
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except:
-                    pass
-            if connection and connection.is_connected():
-                try:
-                    connection.close()
-                except:
-                    pass
+        status_url = url_for('library_bp.upload_status', job_id=job_id)
+        stick_to_primary()
+        if wants_json:
+            return jsonify({"job_id": job_id, "status_url": status_url}), 202
+        flash(f"{'Paper' if is_paper == 1 else 'Book'} {secured_bookname} is uploading. Job id: {job_id}", "success")
+        return redirect(url_for('library_bp.library_dashboard'))
 
     return render_template('upload.html')
 
 
+# ---------------upload job status---------------
+@library_bp.route("/upload/status/<job_id>")
+def upload_status(job_id):
+    status = upload_queue.status(job_id)
+    if status is None:
+        return jsonify({"error": "job not found"}), 404
+    if status.get('status') == 'done':
+        # The uploader looks for the new file next; keep them on the primary until replicas have it
+        stick_to_primary()
+    return jsonify(status)
+
+
 # Viewing the pdf file
 @library_bp.route("/view_pdf/<int:book_id>", methods=["GET"])
 def view_pdf(book_id):
-    connection = None
-    cursor = None
     level = None
     subject = None
     is_paper = False
     cloudinary_url = None
 
     try:
-        connection = Get_DbConnection()
-        if not connection:
-            print("Failed to get database connection")
-            flash("Database connection failed", "error")
-            return redirect(url_for('library_bp.library_dashboard'))
-
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM books WHERE BOOK_ID=%s", (book_id,))
-        result = cursor.fetchone()
+        result = item_cache.get(book_id)
 
         if not result:
             flash("File not found", "error")
@@ -803,31 +545,21 @@ def view_pdf(book_id):
         else:
             return redirect(url_for('library_bp.library_dashboard'))
 
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if connection and connection.is_connected():
-            try:
-                connection.close()
-            except:
-                pass
-
 
 # ----------------view books route -----------------------
 @library_bp.route("/books/<level>/<subject>")
 def view_books(level, subject):
     # FIX: Was 'catagory' (typo) in both view routes
     category = request.args.get('category', 'none')
+    limit = page_limit(request.args.get('limit', type=int))
+    after = decode_cursor(request.args.get('cursor'))
     print(f"THE USER {subject}")
-    books = get_book_by_subject_and_level(level, subject)
-    accept_header = request.headers.get("Accept", "")
-    if 'application/json' in accept_header:
-        return jsonify(books)
-    return render_template("booklist.html", category=category, subject=subject,
-                           level=level, books=books, is_papers=False)
+    cached = listing_not_modified()
+    if cached:
+        return cached
+    subject, books, next_cursor = fetch_listing(get_book_by_subject_and_level, level, subject, limit, after)
+    return listing_response('library_bp.view_books', books, next_cursor, limit, category=category,
+                            subject=subject, level=level, is_papers=False)
 
 
 # ----------------view papers route -----------------------
@@ -835,66 +567,192 @@ def view_books(level, subject):
 def view_papers(level, subject):
     # FIX: Was 'catagory' (typo)
     category = request.args.get('category', 'none')
-    papers = get_papers_by_subject_and_level(level, subject)
+    limit = page_limit(request.args.get('limit', type=int))
+    after = decode_cursor(request.args.get('cursor'))
+    cached = listing_not_modified()
+    if cached:
+        return cached
+    subject, papers, next_cursor = fetch_listing(get_papers_by_subject_and_level, level, subject, limit, after)
     print(f"THE USER {subject}")
+    return listing_response('library_bp.view_papers', papers, next_cursor, limit, category=category,
+                            subject=subject, level=level, is_papers=True)
+
+
+# -------------listing rows for the subject in the URL----------
+# The subject is used exactly as given; only when it has no rows is the closest canonical subject tried,
+# so rows stored under a subject the resolver does not know stay reachable. Returns (subject, rows, next_cursor)
+def fetch_listing(fetch, level, subject, limit, after):
+    rows, next_cursor = fetch(level, subject, limit, after)
+    if not rows and after is None:
+        resolved = normalized_subject(subject)
+        if resolved and resolved.lower() != subject.lower():
+            rows, next_cursor = fetch(level, resolved, limit, after)
+            if rows:
+                return resolved, rows, next_cursor
+    return subject, rows, next_cursor
+
+
+# -------------session state rendered into HTML pages----------
+# Flash messages are part of the page, so a page carrying them belongs to this client only
+def has_session_state():
+    return bool(session.get('_flashes'))
+
+
+# -------------conditional GET for the listings----------
+# The ETag is the catalogue stamp plus the URL and the representation, so it is known before the listing query.
+# Returns a 304 response, or None when the listing has to be built
+def listing_etag():
+    # The stamp may predate the client's own upload or delete, so such requests are never answered with a 304
+    if reads_own_writes():
+        return None, None
+    wants_json = 'application/json' in request.headers.get("Accept", "")
+    if not wants_json and has_session_state():
+        return None, None
+    token, changed_at = catalogue_version.get()
+    if token is None:
+        return None, None
+    return make_etag(token, request.full_path, 'json' if wants_json else 'html'), changed_at
+
+
+def listing_not_modified():
+    etag, changed_at = listing_etag()
+    if etag and is_not_modified(request, etag, changed_at):
+        return set_cache_headers(make_response('', 304), etag, changed_at, LISTING_MAX_AGE)
+    return None
+
+
+# -------------rendered listing rows, cached per catalogue version and URL----------
+# Returns None when the rows cannot be cached; booklist.html then renders them itself
+def listing_rows_html(rows, subject, level, is_papers, next_url):
+    token, _changed_at = catalogue_version.get()
+    if token is None or not rows or reads_own_writes():
+        return None
+    key = ('listing_rows', token, request.full_path)
+    return fragment_cache.get_or_render(key, lambda: render_template('booklist_rows.html', books=rows, subject=subject,
+                                                                     level=level, is_papers=is_papers,
+                                                                     next_url=next_url))
+
+
+# -------------listing response shared by the books and papers routes----------
+# JSON keeps the plain list body; the next page is announced in X-Next-Cursor and a Link header
+def listing_response(endpoint, rows, next_cursor, limit, category, subject, level, is_papers):
+    next_url = None
+    if next_cursor:
+        next_url = url_for(endpoint, level=level, subject=subject, category=category,
+                           limit=limit, cursor=next_cursor)
+    # Taken before the render, which consumes any flash messages
+    etag, changed_at = listing_etag()
     accept_header = request.headers.get("Accept", "")
     if 'application/json' in accept_header:
-        return jsonify(papers)
-    return render_template("booklist.html", category=category, subject=subject,
-                           level=level, books=papers, is_papers=True)
+        response = jsonify(rows)
+    else:
+        response = make_response(render_template("booklist.html", category=category, subject=subject, level=level,
+                                                 books=rows, is_papers=is_papers, next_url=next_url,
+                                                 rows_html=listing_rows_html(rows, subject, level, is_papers, next_url)))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    # An empty page may be a failed query, so it is never handed out as cacheable
+    if etag and rows:
+        set_cache_headers(response, etag, changed_at, LISTING_MAX_AGE)
+    return response
+
+
+# ---------------full-text search over the catalogue---------------
+def search_books(boolean_query, years, level=None, is_paper=None, limit=LISTING_PAGE_SIZE, offset=0):
+    try:
+        clauses, params = search_filters(level, is_paper, years)
+        if boolean_query:
+            clauses.insert(0, f"MATCH({SEARCH_COLUMNS}) AGAINST (%s IN BOOLEAN MODE)")
+            params.insert(0, boolean_query)
+            score = f"MATCH({SEARCH_COLUMNS}) AGAINST (%s IN BOOLEAN MODE)"
+            params.insert(0, boolean_query)
+        else:
+            score = "0"
+        sql = f"""SELECT BOOK_ID,TITLE,AUTHOR,DESCRIPTION,SUBJECT,LEVEL,IS_PAPER,FILE_SIZE,FORMAT,BOOK_YEAR,
+                EXAMINATION_SEASON,{score} AS SCORE
+                FROM books WHERE {' AND '.join(clauses)}
+                ORDER BY SCORE DESC, UPLOAD_DATE DESC, BOOK_ID DESC LIMIT %s OFFSET %s"""
+        with db_cursor(dictionary=True, read_only=True) as cursor:
+            cursor.execute(sql, params + [limit, offset])
+            return cursor.fetchall()
+    except Exception as err:
+        print(f"Error occured: {err}")
+        return []
+
+
+@library_bp.route("/search")
+def search():
+    query = request.args.get('q', '').strip()
+    level = request.args.get('level') or None
+    is_paper = request.args.get('is_paper', type=int)
+    limit = page_limit(request.args.get('limit', type=int))
+    page = max(request.args.get('page', 1, type=int), 1)
+    boolean_query, years = build_search_query(query)
+    year = request.args.get('year', type=int)
+    if year:
+        years = [year]
+    wants_json = 'application/json' in request.headers.get("Accept", "")
+    if not boolean_query and not years:
+        if wants_json:
+            return jsonify({"error": "Enter at least one word of 3 or more letters, or a year"}), 400
+        flash("Enter at least one word of 3 or more letters, or a year", "error")
+        return redirect(url_for('library_bp.library_dashboard'))
+    # One extra row tells us whether there is a next page
+    results = search_books(boolean_query, years, level, is_paper, limit + 1, (page - 1) * limit)
+    next_url = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_url = url_for('library_bp.search', q=query, level=level, is_paper=is_paper, year=year,
+                           limit=limit, page=page + 1)
+    for row in results:
+        row['SCORE'] = float(row['SCORE'] or 0)
+    if wants_json:
+        response = jsonify(results)
+    else:
+        response = make_response(render_template("booklist.html", category='none', subject=query,
+                                                 level=level or 'all', books=results, is_papers=is_paper == 1,
+                                                 next_url=next_url, search_query=query))
+    if next_url:
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
 
 
 # ------------------route for download-----------
 @library_bp.route("/book/<int:book_id>/download")
 def download_pdf(book_id):
-    custom_name = None
-    level = None
-    subject = None
-    book = get_book_by_book_id(book_id)
+    try:
+        item = item_cache.get(book_id)
+    except Exception as e:
+        print(f"ERROR OCCURED: {e}")
+        flash(f"Download failed please try again later!", "error")
+        return redirect(url_for('library_bp.library_dashboard'))
 
-    if book is not None and book.get('FILE_PATH'):
-        url = book['FILE_PATH']
-        level = book.get('LEVEL')
-        subject = book.get('SUBJECT')
+    if item is not None and item.get('FILE_PATH'):
+        url = item['FILE_PATH']
+        level = item.get('LEVEL')
+        subject = item.get('SUBJECT')
+        is_paper = item.get('IS_PAPER') == 1
+        listing = 'library_bp.view_papers' if is_paper else 'library_bp.view_books'
         if 'cloudinary.com' in url:
-            custom_name = book.get('FILENAME', 'document.pdf')
+            custom_name = item.get('FILENAME') or 'document.pdf'
             try:
                 print(f"The URL is: {url}")
                 print(f"The level is: {level}")
                 print(f"The Custom name is: {custom_name}")
                 print(f"The subject is: {subject}")
-                response = requests.get(url)
-                response.raise_for_status()
-                increment_book_downloads(book_id)
-                return send_file(BytesIO(response.content), mimetype='application/pdf',
-                                 as_attachment=True, download_name=custom_name)
-            except Exception as e:
-                print(f"ERROR OCCURED: {e}")
-                flash(f"Download failed please try again later!", "error")
-                return redirect(url_for('library_bp.view_books', level=level, subject=subject))
-
-    # -----------downloading paper
-    paper = get_paper_by_id(book_id)
-    if paper is not None and paper.get('FILE_PATH'):
-        url = paper.get('FILE_PATH')
-        level = paper.get('LEVEL')
-        subject = paper.get('SUBJECT')
-        if 'cloudinary.com' in url:
-            custom_name = paper.get('FILENAME')
-            try:
-                print(f"The URL is: {url}")
-                print(f"The level is: {level}")
-                print(f"The subject is: {subject}")
-                print(f"The Custom name is: {custom_name}")
-                response = requests.get(url, stream=True)
-                response.raise_for_status()
-                increment_paper_downloads(book_id)
-                return send_file(BytesIO(response.content), mimetype='application/pdf',
-                                 as_attachment=True, download_name=custom_name)
+                cache_key = content_cache.item_key(item.get('CLOUDINARY_PUBLIC_ID'), book_id)
+                response, first_chunk = serve_download(url, custom_name, cache_key)
+                if first_chunk:
+                    if is_paper:
+                        increment_paper_downloads(book_id)
+                    else:
+                        increment_book_downloads(book_id)
+                return response
             except Exception as e:
                 print(f"ERROR OCCURED: {e}")
                 flash(f"Download failed please try again later!", "error")
-                return redirect(url_for('library_bp.view_papers', level=level, subject=subject))
+                return redirect(url_for(listing, level=level, subject=subject))
 
     # If we get here, neither book nor paper was found
     flash("File not found", "error")
@@ -920,6 +778,17 @@ def share(level, subject):
     return redirect(whatsapp_url)
 
 
+# -------------------------runtime stats route -----------------
+@library_bp.route("/stats")
+def runtime_stats():
+    return jsonify({"db_pool": db_pool_stats(), "db_replicas": db_replica_stats(), "http_pool": pool_stats(), "content_cache": content_cache.cache_stats(),
+                    "counters": counter_buffer.stats(), "dashboard": dashboard_cache.stats(),
+                    "item_cache": item_cache.stats(), "subjects": subject_resolver.stats(),
+                    "catalogue_version": catalogue_version.stats(), "compression": response_compressor.stats(),
+                    "fragments": fragment_cache.stats(), "db_sessions": session_stats.stats(),
+                    "catalogue": catalogue.stats()})
+
+
 # --------------------Delete both books and papers route----------------
 @library_bp.route("/book/<int:book_id>/delete", methods=["GET", "POST"])
 def delete_books_and_papers(book_id):
@@ -928,13 +797,9 @@ def delete_books_and_papers(book_id):
     is_paper = False
 
     try:
-        # Try to get as book first
-        item = get_book_by_book_id(book_id)
-
-        if item is None:
-            # If not a book, try as paper
-            item = get_paper_by_id(book_id)
-            is_paper = True
+        # One lookup tells us whether it is a book or a paper
+        item, item_type = get_item_by_id(book_id, 'item_for_delete')
+        is_paper = item_type == 'paper'
 
         if item is None:
             flash("File not found", "error")
@@ -943,6 +808,7 @@ def delete_books_and_papers(book_id):
         level = item.get('LEVEL')
         subject = item.get('SUBJECT')
         public_id = item.get('CLOUDINARY_PUBLIC_ID')
+        content_cache.invalidate(content_cache.item_key(public_id, book_id))
 
         if not public_id:
             flash("File has no saved public ID", "error")
@@ -950,7 +816,7 @@ def delete_books_and_papers(book_id):
         else:
             try:
                 # FIX: Was resource_type="image" — PDFs are stored as resource_type="raw"
-                result = cloudinary.uploader.destroy(public_id, resource_type="raw")
+                result = cloudinary_uploader().destroy(public_id, resource_type="raw")
                 if result.get('result') == "ok":
                     flash("File has been deleted successfully from Cloudinary", "success")
                     print(f"File deleted successfully from cloudinary: {public_id}")
@@ -962,12 +828,14 @@ def delete_books_and_papers(book_id):
                 flash(f"Cloudinary error: {e}", "error")
 
         # Delete from database
-        if is_paper:
-            DB_delete = delete_paper_by_book_id(book_id)
-        else:
-            DB_delete = delete_book_by_book_id(book_id)
+        DB_delete = delete_item_by_id(book_id)
 
         if DB_delete:
+            item_cache.invalidate(book_id)
+            catalogue.remove(book_id)
+            catalogue_version.invalidate()
+            stick_to_primary()
+            dashboard_cache.record_delete(item)
             flash("File has been deleted successfully from the database", "success")
             print(f"Deletion from database successful")
         else:
@@ -0,0 +1,9 @@
+-- Index for the keyset-paginated book and paper listings.
+-- view_books / view_papers filter on IS_PAPER, LEVEL and SUBJECT and page through
+-- ORDER BY UPLOAD_DATE DESC, BOOK_ID DESC with a (UPLOAD_DATE, BOOK_ID) cursor, so each page
+-- is a short range read on this index with no filesort, however deep the page.
+--
+-- Apply with: mysql -h $DB_HOST -P $DB_PORT -u $DB_USER -p $DB_DATABASE < migrations/002_listing_keyset_index.sql
+
+CREATE INDEX idx_books_listing
+    ON books (IS_PAPER, LEVEL, SUBJECT, UPLOAD_DATE, BOOK_ID);
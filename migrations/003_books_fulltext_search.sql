@@ -0,0 +1,9 @@
+-- FULLTEXT index behind /search.
+-- search_books runs MATCH(TITLE,AUTHOR,DESCRIPTION,SUBJECT,EXAMINATION_SEASON) AGAINST (... IN BOOLEAN MODE)
+-- with prefix terms; the column list here must stay identical to SEARCH_COLUMNS in search.py.
+-- BOOK_YEAR is numeric and is filtered with a plain predicate instead.
+--
+-- Apply with: mysql -h $DB_HOST -P $DB_PORT -u $DB_USER -p $DB_DATABASE < migrations/003_books_fulltext_search.sql
+
+ALTER TABLE books
+    ADD FULLTEXT INDEX ft_books_search (TITLE, AUTHOR, DESCRIPTION, SUBJECT, EXAMINATION_SEASON);
@@ -0,0 +1,17 @@
+-- Delete log polled by the in-process catalogue.
+-- delete_item_by_id writes one row here in the same transaction as the DELETE, and every worker's
+-- catalogue reads the entries after the last LOG_ID it has seen, so a delete made on one worker
+-- disappears from the listings of the others within CATALOGUE_REFRESH_INTERVAL seconds.
+-- Apply this before deploying the code that writes to it.
+--
+-- Entries are only needed until every worker has polled past them; each worker also reloads the whole
+-- catalogue every CATALOGUE_FULL_RELOAD seconds, so old entries can be trimmed with e.g.
+--   DELETE FROM books_delete_log WHERE DELETED_AT < NOW() - INTERVAL 1 DAY;
+--
+-- Apply with: mysql -h $DB_HOST -P $DB_PORT -u $DB_USER -p $DB_DATABASE < migrations/004_books_delete_log.sql
+
+CREATE TABLE IF NOT EXISTS books_delete_log (
+    LOG_ID BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    BOOK_ID INT NOT NULL,
+    DELETED_AT DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,46 @@
+import os
+import base64
+from datetime import datetime
+
+#Page sizes for the book and paper listings
+LISTING_PAGE_SIZE = int(os.getenv('LISTING_PAGE_SIZE', 50))
+LISTING_MAX_PAGE_SIZE = int(os.getenv('LISTING_MAX_PAGE_SIZE', 200))
+
+
+#--------------------clamp the limit query parameter---------------
+def page_limit(limit):
+    if not limit or limit < 1:
+        return LISTING_PAGE_SIZE
+    return min(limit, LISTING_MAX_PAGE_SIZE)
+
+
+#--------------------keyset cursor on (UPLOAD_DATE, BOOK_ID)---------------
+def encode_cursor(upload_date, book_id):
+    raw = f"{upload_date.isoformat()}|{book_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+#Returns (upload_date, book_id), or None for a missing or garbled token
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        upload_date, book_id = raw.split("|", 1)
+        return datetime.fromisoformat(upload_date), int(book_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
+#--------------------split an over-fetched page into rows and the next cursor---------------
+#Queries fetch limit+1 rows so we know whether another page exists without a COUNT
+def split_page(rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['UPLOAD_DATE'], last['BOOK_ID'])
+    for row in rows:
+        row.pop('UPLOAD_DATE', None)
+    return rows, next_cursor
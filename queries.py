@@ -0,0 +1,61 @@
+import os
+from credit_engine import USE_CREDIT_SQL, USER_EXISTS_SQL
+from upload_jobs import BOOK_INSERT_SQL
+from catalogue import CATALOGUE_COLUMNS
+
+#Hot queries run as server-side prepared statements, one per pooled connection. Set DB_PREPARED=0 to send them as text
+DB_PREPARED = os.getenv('DB_PREPARED', '1') != '0'
+
+ITEM_COLUMNS = "BOOK_ID,IS_PAPER,LEVEL,SUBJECT,FILE_PATH,FILENAME,CLOUDINARY_PUBLIC_ID"
+
+_BOOK_LISTING = """SELECT BOOK_ID,TITLE,AUTHOR,DESCRIPTION,FILE_SIZE,FORMAT,BOOK_YEAR,YEAR(UPLOAD_DATE) AS UYEAR,UPLOAD_DATE
+    FROM books WHERE SUBJECT=%s AND LEVEL=%s AND IS_PAPER=0 {keyset}
+    ORDER BY UPLOAD_DATE DESC, BOOK_ID DESC LIMIT %s"""
+_PAPER_LISTING = """SELECT BOOK_ID,TITLE,AUTHOR,DESCRIPTION,FILE_SIZE,BOOK_YEAR,EXAMINATION_SEASON,FORMAT,YEAR(UPLOAD_DATE) AS UYEAR,
+    coalesce(VIEW_COUNT,0) AS VIEWS,COALESCE(DOWNLOAD_COUNT,0) AS DOWNLOADS,UPLOAD_DATE
+    FROM books WHERE SUBJECT=%s AND LEVEL=%s AND IS_PAPER=1 {keyset}
+    ORDER BY UPLOAD_DATE DESC, BOOK_ID DESC LIMIT %s"""
+_KEYSET = "AND (UPLOAD_DATE < %s OR (UPLOAD_DATE = %s AND BOOK_ID < %s))"
+_CATALOGUE_ROWS = f"SELECT {','.join(CATALOGUE_COLUMNS)} FROM books"
+
+
+#--------------------named query registry---------------
+#Every statement has one fixed text, so a prepared statement can be reused for it on each connection.
+#Queries whose text depends on the number of items (IN lists, CASE batches) stay as plain text
+QUERIES = {
+    'dashboard_groups': """SELECT IS_PAPER, LEVEL, SUBJECT, COUNT(*) AS TOTAL,
+        SUM(UPLOAD_DATE >= CURRENT_DATE() - INTERVAL 1 MONTH) AS NEW_TOTAL,
+        SUM(DOWNLOAD_COUNT) AS DOWNLOADS, SUM(VIEW_COUNT) AS VIEWS
+        FROM books GROUP BY IS_PAPER, LEVEL, SUBJECT""",
+    'books_listing': _BOOK_LISTING.format(keyset=""),
+    'books_listing_after': _BOOK_LISTING.format(keyset=_KEYSET),
+    'papers_listing': _PAPER_LISTING.format(keyset=""),
+    'papers_listing_after': _PAPER_LISTING.format(keyset=_KEYSET),
+    'item_by_id': f"SELECT {ITEM_COLUMNS} FROM books WHERE BOOK_ID=%s",
+    'item_for_delete': f"SELECT {ITEM_COLUMNS},UPLOAD_DATE,VIEW_COUNT,DOWNLOAD_COUNT FROM books WHERE BOOK_ID=%s",
+    'catalogue_stamp': """SELECT MAX(BOOK_ID) AS MAX_ID, MAX(UPLOAD_DATE) AS LAST_UPLOAD, COUNT(*) AS TOTAL,
+        (SELECT MAX(DELETED_AT) FROM books_delete_log) AS LAST_DELETE FROM books""",
+    'delete_book': "DELETE FROM books WHERE BOOK_ID=%s",
+    'log_delete': "INSERT INTO books_delete_log (BOOK_ID) VALUES (%s)",
+    'catalogue_rows': _CATALOGUE_ROWS,
+    'catalogue_rows_after': _CATALOGUE_ROWS + " WHERE BOOK_ID > %s ORDER BY BOOK_ID",
+    'catalogue_deletes_after': """SELECT LOG_ID, BOOK_ID, DELETED_AT FROM books_delete_log WHERE LOG_ID > %s
+        ORDER BY LOG_ID""",
+    'catalogue_log_head': "SELECT COALESCE(MAX(LOG_ID), 0) AS LOG_ID, MAX(DELETED_AT) AS LAST_DELETE FROM books_delete_log",
+    'insert_book': BOOK_INSERT_SQL,
+    'user_by_jid': "SELECT username, credits, last_reset FROM whatsapp_user WHERE jid=%s",
+    'register_user': """INSERT INTO whatsapp_user(jid, username, datejoined, last_reset, credits,
+        download_count) VALUES(%s,%s,now(),%s,%s,0)""",
+    'use_credit': USE_CREDIT_SQL,
+    'user_exists': USER_EXISTS_SQL,
+}
+
+
+#Listing statement and parameters for one page; after is the decoded keyset cursor or None
+def listing_query(is_paper, level, subject, limit, after=None):
+    name = ('papers_listing' if is_paper else 'books_listing') + ('_after' if after else '')
+    params = [subject, level]
+    if after:
+        params += [after[0], after[0], after[1]]
+    params.append(limit)
+    return name, params
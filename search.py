@@ -0,0 +1,41 @@
+import re
+
+#Columns covered by the FULLTEXT index from migrations/003
+SEARCH_COLUMNS = "TITLE,AUTHOR,DESCRIPTION,SUBJECT,EXAMINATION_SEASON"
+#InnoDB ignores shorter tokens (innodb_ft_min_token_size), so they are not sent
+MIN_TOKEN_LENGTH = 3
+MAX_TOKENS = 8
+
+_TOKEN_PATTERN = re.compile(r"[0-9A-Za-z]+")
+_YEAR_PATTERN = re.compile(r"^(19|20)[0-9]{2}$")
+
+
+#--------------------turn free text into a boolean-mode MATCH query---------------
+#Every word is required and prefix matched ("chem pap" finds "Chemistry Paper").
+#Four digit years become a BOOK_YEAR filter because BOOK_YEAR is not a text column.
+#Returns (boolean_query, years)
+def build_search_query(text):
+    words = []
+    years = []
+    for token in _TOKEN_PATTERN.findall(text or ""):
+        if _YEAR_PATTERN.match(token):
+            years.append(int(token))
+        elif len(token) >= MIN_TOKEN_LENGTH:
+            words.append(f"+{token.lower()}*")
+    return " ".join(words[:MAX_TOKENS]), years
+
+
+#--------------------WHERE clause and parameters for the search filters---------------
+def search_filters(level=None, is_paper=None, years=None):
+    clauses = []
+    params = []
+    if level:
+        clauses.append("LEVEL=%s")
+        params.append(level)
+    if is_paper is not None:
+        clauses.append("IS_PAPER=%s")
+        params.append(is_paper)
+    if years:
+        clauses.append(f"BOOK_YEAR IN ({','.join(['%s'] * len(years))})")
+        params.extend(years)
+    return clauses, params
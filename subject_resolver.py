@@ -0,0 +1,87 @@
+import os
+from functools import lru_cache
+
+#A fuzzy match must score above this (1.0 = identical) before it replaces what the user typed.
+#At 0.75 unrelated subjects such as "Food Science" and "Crop Science" were merged
+SUBJECT_MATCH_THRESHOLD = float(os.getenv('SUBJECT_MATCH_THRESHOLD', 0.8))
+#How many trigram candidates get the exact edit distance check
+SUBJECT_MATCH_CANDIDATES = 8
+SUBJECT_CACHE_SIZE = int(os.getenv('SUBJECT_CACHE_SIZE', 4096))
+
+
+def _clean(text):
+    return " ".join(text.lower().split())
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+#--------------------maps free-text subjects onto the canonical subject names---------------
+#Exact aliases come from SUBJCT_MAP, canonical names from its values and the SUBJECT_IMOJIS keys.
+#Anything else is matched by trigram overlap + edit distance, so "mathmatics" still lands on Mathematics
+class SubjectResolver:
+    def __init__(self, alias_map, subject_names, threshold=SUBJECT_MATCH_THRESHOLD, cache_size=SUBJECT_CACHE_SIZE):
+        self.threshold = threshold
+        self.aliases = {}
+        for canonical in alias_map.values():
+            self.aliases.setdefault(_clean(canonical), canonical)
+        for name in subject_names:
+            #Same spelling the old title() fallback stored, so existing rows keep matching
+            self.aliases.setdefault(_clean(name), name.title())
+        for alias, canonical in alias_map.items():
+            self.aliases[_clean(alias)] = canonical
+        self.trigram_index = {}
+        for alias in self.aliases:
+            for gram in _trigrams(alias):
+                self.trigram_index.setdefault(gram, []).append(alias)
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    #Returns (canonical, confidence); canonical is None when nothing is close enough
+    def _resolve(self, text):
+        cleaned = _clean(text or "")
+        if not cleaned:
+            return None, 0.0
+        if cleaned in self.aliases:
+            return self.aliases[cleaned], 1.0
+        shared = {}
+        for gram in _trigrams(cleaned):
+            for alias in self.trigram_index.get(gram, ()):
+                shared[alias] = shared.get(alias, 0) + 1
+        candidates = sorted(shared, key=lambda alias: (-shared[alias], alias))[:SUBJECT_MATCH_CANDIDATES]
+        best = None
+        best_score = 0.0
+        for alias in candidates:
+            score = 1.0 - edit_distance(cleaned, alias) / max(len(cleaned), len(alias))
+            if score > best_score:
+                best, best_score = self.aliases[alias], score
+            elif score == best_score and best != self.aliases[alias]:
+                #Two different subjects are equally close: refuse to guess
+                best = None
+        if best is None or best_score <= self.threshold:
+            return None, best_score
+        return best, best_score
+
+    def normalize(self, text):
+        if not text:
+            return None
+        canonical, _confidence = self.resolve(text)
+        return canonical or text.strip().title()
+
+    def stats(self):
+        info = self.resolve.cache_info()
+        return {"aliases": len(self.aliases), "threshold": self.threshold, "hits": info.hits,
+                "misses": info.misses, "cached": info.currsize}
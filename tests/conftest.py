@@ -0,0 +1,53 @@
+import os
+import sys
+import sqlite3
+
+#Tests import the flat modules from the project root and never need a real MySQL server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+
+
+#--------------------sqlite stand-in for a mysql.connector connection---------------
+#Only translates the %s placeholder style; the SQL itself has to be valid in both dialects
+class SqliteCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, list(params)))
+        self.cursor.execute(sql.replace('%s', '?'), list(params))
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+
+class SqliteConnection:
+    def __init__(self, path):
+        self.cnx = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.cursors = []
+        self.commits = 0
+        self.closed = False
+
+    def cursor(self, dictionary=False):
+        cursor = SqliteCursor(self.cnx.cursor())
+        self.cursors.append(cursor)
+        return cursor
+
+    def commit(self):
+        self.commits += 1
+        self.cnx.commit()
+
+    def rollback(self):
+        self.cnx.rollback()
+
+    def close(self):
+        self.closed = True
+        self.cnx.close()
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from conftest import SqliteConnection
+from counters import CounterBuffer
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "counters.db")
+    cnx = sqlite3.connect(path)
+    cnx.execute("CREATE TABLE books (BOOK_ID INTEGER PRIMARY KEY, VIEW_COUNT INTEGER, DOWNLOAD_COUNT INTEGER)")
+    cnx.execute("CREATE TABLE whatsapp_user (jid TEXT PRIMARY KEY, download_count INTEGER)")
+    cnx.executemany("INSERT INTO books VALUES (?, ?, ?)", [(1, 10, 0), (2, None, 5), (3, 0, 0)])
+    cnx.executemany("INSERT INTO whatsapp_user VALUES (?, ?)", [("a", 1), ("b", None)])
+    cnx.commit()
+    cnx.close()
+    return path
+
+
+def read(path, sql):
+    cnx = sqlite3.connect(path)
+    try:
+        return cnx.execute(sql).fetchall()
+    finally:
+        cnx.close()
+
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.connections = []
+
+    def __call__(self):
+        connection = SqliteConnection(self.path)
+        self.connections.append(connection)
+        return connection
+
+    def statements(self):
+        return [statement for connection in self.connections
+                for cursor in connection.cursors for statement in cursor.statements]
+
+
+def buffer_for(connect, **kwargs):
+    buffer = CounterBuffer(connect=connect, interval=3600, **kwargs)
+    #No flusher thread, the tests call flush themselves
+    buffer._ensure_thread = lambda: None
+    return buffer
+
+
+#--------------------CASE update adds each row's own amount---------------
+def test_flush_applies_case_update(db_path):
+    connect = Recorder(db_path)
+    buffer = buffer_for(connect)
+    buffer.add('book_views', 1)
+    buffer.add('book_views', 1)
+    buffer.add('book_views', 2, 3)
+    buffer.add('book_downloads', 3)
+    buffer.add('user_downloads', 'b', 4)
+
+    assert buffer.flush() == 4
+    assert read(db_path, "SELECT BOOK_ID, VIEW_COUNT, DOWNLOAD_COUNT FROM books ORDER BY BOOK_ID") == \
+        [(1, 12, 0), (2, 3, 5), (3, 0, 1)]
+    assert read(db_path, "SELECT jid, download_count FROM whatsapp_user ORDER BY jid") == [("a", 1), ("b", 4)]
+    #One connection and one commit for everything buffered
+    assert len(connect.connections) == 1
+    assert connect.connections[0].commits == 1
+    assert connect.connections[0].closed
+    assert buffer.stats()["pending_rows"] == 0
+    assert buffer.flush() == 0
+
+
+def test_case_statement_shape(db_path):
+    connect = Recorder(db_path)
+    buffer = buffer_for(connect)
+    buffer.add('book_views', 1, 2)
+    buffer.add('book_views', 3)
+    buffer.flush()
+
+    [(sql, params)] = connect.statements()
+    assert sql == ("UPDATE books SET VIEW_COUNT=COALESCE(VIEW_COUNT,0)+CASE BOOK_ID WHEN %s THEN %s WHEN %s THEN %s END "
+                   "WHERE BOOK_ID IN (%s,%s)")
+    assert params == [1, 2, 3, 1, 1, 3]
+
+
+#--------------------batching---------------
+def test_flush_splits_batches(db_path):
+    connect = Recorder(db_path)
+    buffer = buffer_for(connect, batch_size=2)
+    for book_id in (1, 2, 3):
+        buffer.add('book_views', book_id)
+
+    assert buffer.flush() == 3
+    statements = connect.statements()
+    assert [sql.count("WHEN") for sql, _params in statements] == [2, 1]
+    assert read(db_path, "SELECT VIEW_COUNT FROM books ORDER BY BOOK_ID") == [(11,), (1,), (1,)]
+
+
+def test_full_buffer_wakes_flusher(db_path):
+    buffer = buffer_for(Recorder(db_path), max_pending=2)
+    buffer.add('book_views', 1)
+    buffer.add('book_views', 1)
+    assert not buffer.wakeup.is_set()
+    buffer.add('book_views', 2)
+    assert buffer.wakeup.is_set()
+
+
+def test_failed_flush_is_retried(db_path):
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise RuntimeError("database down")
+
+    buffer = buffer_for(broken)
+    buffer.add('book_views', 1, 2)
+    assert buffer.flush() == 0
+    assert buffer.stats()["failed_flushes"] == 1
+    assert buffer.stats()["pending_rows"] == 1
+
+    buffer.add('book_views', 1)
+    buffer.connect = Recorder(db_path)
+    assert buffer.flush() == 1
+    assert read(db_path, "SELECT VIEW_COUNT FROM books WHERE BOOK_ID=1") == [(13,)]
+
+
+def test_unknown_counter_rejected(db_path):
+    with pytest.raises(KeyError):
+        buffer_for(Recorder(db_path)).add('book_likes', 1)
+
+
+#--------------------atexit flush writes what is still buffered---------------
+def test_atexit_flush(db_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})
+        sys.path.insert(0, {root!r})
+        from conftest import SqliteConnection
+        import counters
+        counters.counter_buffer.connect = lambda: SqliteConnection({db_path!r})
+        counters.counter_buffer.add('book_downloads', 2, 7)
+        counters.counter_buffer.add('user_downloads', 'a')
+    """)
+    env = dict(os.environ, COUNTER_FLUSH_INTERVAL='3600')
+    subprocess.run([sys.executable, "-c", script], check=True, env=env, timeout=60)
+
+    assert read(db_path, "SELECT DOWNLOAD_COUNT FROM books WHERE BOOK_ID=2") == [(12,)]
+    assert read(db_path, "SELECT download_count FROM whatsapp_user WHERE jid='a'") == [(2,)]
@@ -0,0 +1,132 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from conftest import SqliteConnection, SqliteCursor
+from credit_engine import DAILY_CREDITS, refusal_reason, spend_credit
+
+TODAY = '2026-01-02'
+YESTERDAY = '2026-01-01'
+
+
+#--------------------sqlite stand-in with the MySQL functions USE_CREDIT_SQL needs---------------
+#LAST_INSERT_ID(expr) returns expr and remembers it for the connection, which the connector exposes as lastrowid
+class CreditCursor(SqliteCursor):
+    def __init__(self, cursor, connection):
+        super().__init__(cursor)
+        self.connection = connection
+
+    @property
+    def lastrowid(self):
+        return self.connection.last_insert_id
+
+
+class CreditConnection(SqliteConnection):
+    def __init__(self, path):
+        super().__init__(path)
+        self.last_insert_id = 0
+        self.cnx.create_function("IF", 3, lambda condition, yes, no: yes if condition else no)
+        self.cnx.create_function("LAST_INSERT_ID", 1, self._last_insert_id)
+
+    def _last_insert_id(self, value):
+        self.last_insert_id = value
+        return value
+
+    def cursor(self, dictionary=False):
+        return CreditCursor(self.cnx.cursor(), self)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "credits.db")
+    cnx = sqlite3.connect(path)
+    cnx.execute("CREATE TABLE whatsapp_user (jid TEXT PRIMARY KEY, credits INTEGER, last_reset TEXT)")
+    cnx.executemany("INSERT INTO whatsapp_user VALUES (?, ?, ?)",
+                    [("fresh", None, None), ("spent", 0, TODAY), ("stale", 0, YESTERDAY), ("busy", 3, TODAY)])
+    cnx.commit()
+    cnx.close()
+    return path
+
+
+def spend(path, jid):
+    connection = CreditConnection(path)
+    try:
+        cursor = connection.cursor()
+        status, remaining = spend_credit(cursor, jid, TODAY)
+        if status == 'refused':
+            status = refusal_reason(connection.cursor(), jid)
+        connection.commit()
+        return status, remaining
+    finally:
+        connection.close()
+
+
+def balance(path, jid):
+    cnx = sqlite3.connect(path)
+    try:
+        return cnx.execute("SELECT credits, last_reset FROM whatsapp_user WHERE jid=?", (jid,)).fetchone()
+    finally:
+        cnx.close()
+
+
+def test_spend_and_daily_reset(db_path):
+    assert spend(db_path, "fresh") == ('ok', DAILY_CREDITS - 1)
+    assert balance(db_path, "fresh") == (DAILY_CREDITS - 1, TODAY)
+    assert spend(db_path, "stale") == ('ok', DAILY_CREDITS - 1)
+    assert spend(db_path, "busy") == ('ok', 2)
+
+
+def test_refusals(db_path):
+    assert spend(db_path, "spent") == ('no_credits', 0)
+    assert balance(db_path, "spent") == (0, TODAY)
+    assert spend(db_path, "nobody") == ('not_found', 0)
+
+
+#--------------------thousands of parallel /user/use-credit calls never spend a credit twice---------------
+#Every request checks out its own sqlite connection, like a pooled MySQL connection, and commits in after_request
+class RouteConnection(CreditConnection):
+    def discard(self):
+        self.close()
+
+
+@pytest.fixture
+def credit_app(db_path, monkeypatch):
+    import app as app_module
+    import db_session
+    #The route spends with today's date; sqlite stores it as ISO text like the fixture rows
+    sqlite3.register_adapter(date, date.isoformat)
+    monkeypatch.setattr(db_session, "Get_DbConnection", lambda: RouteConnection(db_path))
+    monkeypatch.setattr(db_session, "DB_PREPARED", False)
+    return app_module.app
+
+
+def test_concurrent_use_credit_route(credit_app, db_path):
+    jids = [f"jid-{n}" for n in range(20)]
+    cnx = sqlite3.connect(db_path)
+    cnx.executemany("INSERT INTO whatsapp_user VALUES (?, NULL, NULL)", [(jid,) for jid in jids])
+    cnx.commit()
+    cnx.close()
+    calls = [jid for jid in jids for _ in range(100)]
+
+    def use_credit(jid):
+        response = credit_app.test_client().post("/user/use-credit", json={"jid": jid})
+        return jid, response.status_code, response.get_json()
+
+    with ThreadPoolExecutor(max_workers=64) as executor:
+        results = list(executor.map(use_credit, calls))
+
+    assert len(results) == len(calls)
+    for jid in jids:
+        outcomes = [(status, body) for result_jid, status, body in results if result_jid == jid]
+        spent = sorted(body["credits"] for status, body in outcomes if status == 200)
+        assert spent == list(range(DAILY_CREDITS))
+        assert all(status == 403 and body["credits"] == 0 for status, body in outcomes if status != 200)
+        credits, last_reset = balance(db_path, jid)
+        assert (credits, last_reset) == (0, date.today().isoformat())
+
+
+def test_use_credit_route_unknown_jid(credit_app):
+    response = credit_app.test_client().post("/user/use-credit", json={"jid": "nobody"})
+    assert response.status_code == 404
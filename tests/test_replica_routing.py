@@ -0,0 +1,253 @@
+import pytest
+from flask import Flask, jsonify
+from mysql.connector import errors
+
+import db_session
+from db_pool import ReplicaRouter
+from db_session import (DbSession, PRIMARY_COOKIE, commit_request_session, db_cursor, release_request_session,
+                        stick_to_primary)
+
+
+class FakeCursor:
+    with_rows = False
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        self.connection.log.append((self.connection.name, sql))
+        if self.connection.broken:
+            raise errors.OperationalError("Lost connection to MySQL server")
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, name, log, pool=None, broken=False):
+        self.name = name
+        self.log = log
+        self.pool = pool
+        self.broken = broken
+        self.commits = 0
+        self.closed = False
+        self.discarded = False
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def statement_cursor(self, name, dictionary=False):
+        return FakeCursor(self)
+
+    def drop_statement(self, name, dictionary=False):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def discard(self):
+        self.discarded = True
+
+
+class FakePool:
+    def __init__(self, name, failure=None):
+        self.name = name
+        self.failure = failure
+        self.checkouts = 0
+        self.db_config = {"host": name, "port": 3306}
+
+    def stats(self):
+        return {"checkouts": self.checkouts}
+
+    def get_connection(self, timeout=None):
+        if self.failure is not None:
+            raise self.failure
+        self.checkouts += 1
+        return FakeConnection(self.name, [], pool=self)
+
+
+#--------------------replica router---------------
+def test_router_round_robin():
+    first, second = FakePool("r1"), FakePool("r2")
+    router = ReplicaRouter([first, second])
+    names = [router.get_connection().name for _ in range(4)]
+    assert names == ["r1", "r2", "r1", "r2"]
+    assert router.stats()["checkouts"] == 4
+
+
+def test_router_without_replicas():
+    assert ReplicaRouter([]).get_connection() is None
+
+
+def test_router_skips_and_marks_down_broken_replica():
+    broken, healthy = FakePool("r1", failure=errors.InterfaceError("refused")), FakePool("r2")
+    router = ReplicaRouter([broken, healthy], retry_after=60)
+    assert router.get_connection().name == "r2"
+    stats = router.stats()
+    assert stats["marked_down"] == 1
+    assert [replica["down"] for replica in stats["replicas"]] == [True, False]
+    #Left out of rotation: the next checkouts do not try it again
+    broken.failure = None
+    assert [router.get_connection().name for _ in range(3)] == ["r2"] * 3
+
+
+def test_router_busy_replica_stays_in_rotation():
+    busy, healthy = FakePool("r1", failure=errors.PoolError("pool exhausted")), FakePool("r2")
+    router = ReplicaRouter([busy, healthy])
+    assert router.get_connection().name == "r2"
+    assert router.stats()["marked_down"] == 0
+
+
+def test_router_fails_over_when_all_down():
+    router = ReplicaRouter([FakePool("r1", failure=errors.InterfaceError("refused"))], retry_after=60)
+    assert router.get_connection() is None
+    assert router.get_connection() is None
+    assert router.stats()["failovers"] == 2
+
+
+def test_router_retries_replica_after_retry_period(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("db_pool.time.monotonic", lambda: clock[0])
+    pool = FakePool("r1", failure=errors.InterfaceError("refused"))
+    router = ReplicaRouter([pool], retry_after=30)
+    assert router.get_connection() is None
+    pool.failure = None
+    clock[0] += 10
+    assert router.get_connection() is None
+    clock[0] += 30
+    assert router.get_connection().name == "r1"
+
+
+#--------------------session routing---------------
+class Connections:
+    def __init__(self, replica=True):
+        self.log = []
+        self.replica = replica
+        self.primaries = []
+        self.replicas = []
+
+    def primary(self):
+        connection = FakeConnection("primary", self.log)
+        self.primaries.append(connection)
+        return connection
+
+    def read(self):
+        if not self.replica:
+            return None
+        connection = FakeConnection("replica", self.log, pool=FakePool("r1"))
+        self.replicas.append(connection)
+        return connection
+
+
+#Which connection db_cursor would use for the query, following its write and read_only handling
+def run(session, write=False, read_only=False):
+    if write:
+        session.wrote = True
+    return session.connection_for(read_only and not write).name
+
+
+def test_session_reads_go_to_replica_until_write():
+    connections = Connections()
+    session = DbSession(connect=connections.primary, connect_read=connections.read)
+    assert run(session, read_only=True) == "replica"
+    assert run(session) == "primary"
+    assert run(session, read_only=True) == "replica"
+    assert run(session, write=True) == "primary"
+    #After a write the request reads its own change from the primary
+    assert run(session, read_only=True) == "primary"
+    assert len(connections.replicas) == 1
+    assert len(connections.primaries) == 1
+
+
+def test_sticky_session_reads_primary():
+    connections = Connections()
+    session = DbSession(connect=connections.primary, connect_read=connections.read, sticky=True)
+    assert run(session, read_only=True) == "primary"
+    assert connections.replicas == []
+
+
+def test_session_without_replica_uses_primary():
+    connections = Connections(replica=False)
+    session = DbSession(connect=connections.primary, connect_read=connections.read)
+    assert run(session, read_only=True) == "primary"
+    assert session.replica_unavailable
+
+
+def test_broken_replica_connection_is_marked_failed(monkeypatch):
+    failed = []
+    monkeypatch.setattr(db_session, "replica_failed", failed.append)
+    connections = Connections()
+    session = DbSession(connect=connections.primary, connect_read=connections.read)
+    replica = session.connection_for(read_only=True)
+    session.discard(replica)
+    assert failed == [replica]
+    assert replica.discarded
+    assert run(session, read_only=True) == "primary"
+
+
+#--------------------request sessions and the sticky cookie---------------
+@pytest.fixture
+def routing(monkeypatch):
+    connections = Connections()
+    monkeypatch.setattr(db_session, "Get_DbConnection", connections.primary)
+    monkeypatch.setattr(db_session, "Get_ReadConnection", connections.read)
+    monkeypatch.setattr(db_session, "DB_PREPARED", False)
+
+    app = Flask(__name__)
+    app.after_request(commit_request_session)
+    app.teardown_request(release_request_session)
+
+    @app.route("/read")
+    def read():
+        with db_cursor(read_only=True) as cursor:
+            cursor.execute("SELECT 1")
+        return jsonify({})
+
+    @app.route("/write", methods=["POST"])
+    def write():
+        with db_cursor(write=True) as cursor:
+            cursor.execute("DELETE FROM books")
+        stick_to_primary()
+        with db_cursor(read_only=True) as cursor:
+            cursor.execute("SELECT 2")
+        return jsonify({})
+
+    return app.test_client(), connections
+
+
+def test_read_request_uses_replica(routing):
+    client, connections = routing
+    response = client.get("/read")
+    assert response.status_code == 200
+    assert connections.log == [("replica", "SELECT 1")]
+    assert PRIMARY_COOKIE not in response.headers.get("Set-Cookie", "")
+    assert connections.replicas[0].closed
+
+
+def test_write_sets_sticky_cookie(routing):
+    client, connections = routing
+    response = client.post("/write")
+    assert connections.log == [("primary", "DELETE FROM books"), ("primary", "SELECT 2")]
+    assert connections.primaries[0].commits == 1
+    cookie = response.headers["Set-Cookie"]
+    assert cookie.startswith(f"{PRIMARY_COOKIE}=1")
+    assert f"Max-Age={db_session.DB_STICKY_SECONDS}" in cookie
+
+    #The client's next reads go to the primary while the cookie lives
+    connections.log.clear()
+    client.get("/read")
+    assert connections.log == [("primary", "SELECT 1")]
+
+    client.delete_cookie(PRIMARY_COOKIE)
+    connections.log.clear()
+    client.get("/read")
+    assert connections.log == [("replica", "SELECT 1")]
@@ -0,0 +1,102 @@
+import io
+import os
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import upload_jobs
+from upload_jobs import LocalFakeUploader, UploadQueue, build_upload_options
+
+FIELDS = {'filename': 'Biology_Notes.pdf', 'author': 'Anon', 'description': 'notes', 'subject': 'Biology',
+          'category': 'Science', 'level': 'ordinary', 'file_type': 'PDF', 'language': 'English',
+          'year': None, 'is_paper': 0, 'exam_season': None}
+CONTENT = b"%PDF-1.4 fake pdf body"
+
+
+def upload_file():
+    return FileStorage(stream=io.BytesIO(CONTENT), filename=FIELDS['filename'])
+
+
+def wait_for(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = queue.status(job_id)
+        if status and status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish: {queue.status(job_id)}")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(upload_jobs, 'UPLOAD_RETRY_BACKOFF', 0)
+
+
+#--------------------queued file goes through the fake uploader into finalize---------------
+def test_upload_completes(tmp_path):
+    saved = []
+
+    def finalize(fields, upload_result):
+        saved.append((fields, upload_result))
+        return 42
+
+    spool = str(tmp_path / "spool")
+    queue = UploadQueue(finalize, uploader=LocalFakeUploader(str(tmp_path / "cdn")), workers=1, spool_dir=spool)
+    job_id = queue.submit(upload_file(), FIELDS, build_upload_options(FIELDS))
+    assert queue.status(job_id)['status'] in ('queued', 'uploading', 'saving', 'done')
+
+    status = wait_for(queue, job_id)
+    assert status['status'] == 'done'
+    assert status['book_id'] == 42
+    assert status['progress'] == 100
+    assert status['public_id'] == 'library_books/Biology_Notes'
+
+    [(fields, result)] = saved
+    assert fields == FIELDS
+    assert result['public_id'] == 'library_books/Biology_Notes'
+    assert result['bytes'] == len(CONTENT)
+    with open(result['secure_url'][len("file://"):], "rb") as uploaded:
+        assert uploaded.read() == CONTENT
+    #The spooled copy is removed, only the status file is left
+    assert os.listdir(spool) == [f"{job_id}.json"]
+
+
+def test_upload_retries_then_succeeds(tmp_path):
+    fake = LocalFakeUploader(str(tmp_path / "cdn"))
+    calls = []
+
+    class Flaky:
+        def upload_large(self, path, **options):
+            calls.append(options['chunk_size'])
+            if len(calls) == 1:
+                raise ConnectionError("reset by peer")
+            return fake.upload_large(path, **options)
+
+    queue = UploadQueue(lambda fields, result: 7, uploader=Flaky(), workers=1, spool_dir=str(tmp_path / "spool"))
+    job_id = queue.submit(upload_file(), FIELDS, build_upload_options(FIELDS))
+    status = wait_for(queue, job_id)
+    assert status['status'] == 'done'
+    assert status['attempt'] == 2
+    assert calls == [upload_jobs.UPLOAD_CHUNK_SIZE] * 2
+
+
+def test_failed_finalize_marks_job_failed(tmp_path):
+    def finalize(fields, upload_result):
+        raise RuntimeError("insert failed")
+
+    spool = str(tmp_path / "spool")
+    queue = UploadQueue(finalize, uploader=LocalFakeUploader(str(tmp_path / "cdn")), workers=1, spool_dir=spool)
+    job_id = queue.submit(upload_file(), FIELDS, build_upload_options(FIELDS))
+    status = wait_for(queue, job_id)
+    assert status['status'] == 'failed'
+    assert status['error'] == 'insert failed'
+    assert os.listdir(spool) == [f"{job_id}.json"]
+
+
+def test_status_rejects_bad_job_ids(tmp_path):
+    queue = UploadQueue(lambda fields, result: 1, spool_dir=str(tmp_path))
+    (tmp_path / "secret.json").write_text('{"status": "done"}')
+    assert queue.status("../secret") is None
+    assert queue.status("") is None
+    assert queue.status("missing") is None
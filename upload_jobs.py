@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.utils import secure_filename
+from helper_functions import normalized_subject, clean_filename
+
+#Uploads are spooled here first. Job status files live next to them so every worker on the host can report on any job
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'swiftlab_upload_spool'))
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 2))
+#Cloudinary upload_large sends the file in chunks of this size
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 20 * 1024 * 1024))
+UPLOAD_RETRIES = int(os.getenv('UPLOAD_RETRIES', 3))
+UPLOAD_RETRY_BACKOFF = float(os.getenv('UPLOAD_RETRY_BACKOFF', 2))
+#Finished job status files are removed after this many seconds
+UPLOAD_STATUS_TTL = float(os.getenv('UPLOAD_STATUS_TTL', 24 * 3600))
+#When set, files are "uploaded" into this local directory instead of Cloudinary
+UPLOAD_FAKE_DIR = os.getenv('UPLOAD_FAKE_DIR')
+
+
+BOOK_INSERT_SQL = """INSERT INTO books (TITLE,AUTHOR,DESCRIPTION,SUBJECT,CATEGORY,
+    LEVEL,FORMAT,CLOUDINARY_PUBLIC_ID,LANGUAGE,FILENAME,FILE_PATH,FILE_SIZE,BOOK_YEAR,
+    UPLOAD_DATE,IS_PAPER,EXAMINATION_SEASON) VALUES(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,now(),%s,%s) """
+
+
+#--------------------books row fields for an uploaded file---------------
+#Shared by the upload form and the bulk ingest command so both describe files the same way
+def build_fields(original_name, subject, level, is_paper, author=None, exam_season=None, year=None,
+                 category=None, language=None):
+    secured_bookname = secure_filename(clean_filename(original_name))
+    if is_paper == 1:
+        description = f"This is a {subject} question paper for the {author} {level} level {exam_season} {year} session "
+    else:
+        year = None
+        exam_season = None
+        description = f"{secured_bookname} is an {level} {subject} book written by {author if author and author.strip() else 'Unknown Author'} "
+    file_type = original_name.rsplit(".", 1)[1].upper() if "." in original_name else "PDF"
+    return {'filename': secured_bookname, 'author': author, 'description': description,
+            'subject': normalized_subject(subject), 'category': category, 'level': level,
+            'file_type': file_type, 'language': language, 'year': year, 'is_paper': is_paper,
+            'exam_season': exam_season}
+
+
+def build_upload_options(fields):
+    return {'folder': "library_books", 'resource_type': "auto",
+            'public_id': fields['filename'].rsplit(".", 1)[0], 'overwrite': False,
+            'unique_filename': True, 'tags': [fields['category'], fields['level'], fields['language']]}
+
+
+def book_insert_values(fields, upload_result):
+    book_size = round(upload_result['bytes'] / (1024 * 1024), 2)
+    return (fields['filename'], fields['author'], fields['description'], fields['subject'], fields['category'],
+            fields['level'], fields['file_type'], upload_result['public_id'], fields['language'], fields['filename'],
+            upload_result['secure_url'], book_size, fields['year'], fields['is_paper'], fields['exam_season'])
+
+
+#--------------------local stand-in for cloudinary.uploader---------------
+#Returns the same result fields the pipeline reads from Cloudinary
+class LocalFakeUploader:
+    def __init__(self, root):
+        self.root = root
+
+    def upload_large(self, path, folder=None, public_id=None, **options):
+        target_dir = os.path.join(self.root, folder or "")
+        os.makedirs(target_dir, exist_ok=True)
+        public_id = public_id or uuid.uuid4().hex
+        target = os.path.join(target_dir, os.path.basename(public_id) + os.path.splitext(path)[1])
+        shutil.copyfile(path, target)
+        return {"secure_url": "file://" + target, "public_id": f"{folder}/{public_id}" if folder else public_id,
+                "bytes": os.path.getsize(target)}
+
+
+#--------------------cloudinary, imported and configured on first use---------------
+_cloudinary_configured = False
+
+
+def cloudinary_uploader():
+    global _cloudinary_configured
+    import cloudinary
+    import cloudinary.uploader
+    if not _cloudinary_configured:
+        cloudinary.config(
+            cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key=os.getenv("CLOUDINARY_API_KEY"),
+            api_secret=os.getenv("CLOUDINARY_API_SECRET")
+        )
+        _cloudinary_configured = True
+    return cloudinary.uploader
+
+
+def default_uploader():
+    if UPLOAD_FAKE_DIR:
+        return LocalFakeUploader(UPLOAD_FAKE_DIR)
+    return cloudinary_uploader()
+
+
+#--------------------background upload queue with job status---------------
+class UploadQueue:
+    def __init__(self, finalize, uploader=None, workers=UPLOAD_WORKERS, spool_dir=UPLOAD_SPOOL_DIR):
+        #finalize(fields, upload_result) stores the uploaded file in the books table and returns its BOOK_ID
+        self.finalize = finalize
+        self.uploader = uploader
+        self.workers = workers
+        self.spool_dir = spool_dir
+        self.executor = None
+        self.executor_pid = None
+        self.lock = threading.Lock()
+
+    #Worker threads do not survive a fork, so each process starts its own pool on first use
+    def _executor(self):
+        pid = os.getpid()
+        with self.lock:
+            if self.executor is None or self.executor_pid != pid:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload")
+                self.executor_pid = pid
+            return self.executor
+
+    def _status_path(self, job_id):
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    def _write_status(self, job_id, **fields):
+        path = self._status_path(job_id)
+        status = self.status(job_id) or {"job_id": job_id}
+        status.update(fields, updated_at=time.time())
+        fd, tmp_path = tempfile.mkstemp(dir=self.spool_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(status, tmp_file)
+        os.replace(tmp_path, path)
+        return status
+
+    def status(self, job_id):
+        if not job_id or not all(c.isalnum() for c in job_id):
+            return None
+        try:
+            with open(self._status_path(job_id)) as status_file:
+                return json.load(status_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _prune(self):
+        cutoff = time.time() - UPLOAD_STATUS_TTL
+        try:
+            with os.scandir(self.spool_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+        except OSError as err:
+            print(f"Upload spool cleanup error: {err}")
+
+    #--------------------spool the request file to disk and queue it---------------
+    def submit(self, file_storage, fields, upload_options):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._prune()
+        job_id = uuid.uuid4().hex
+        extension = os.path.splitext(fields.get('filename') or "")[1]
+        spool_path = os.path.join(self.spool_dir, job_id + ".upload" + extension)
+        file_storage.save(spool_path)
+        self._write_status(job_id, status="queued", progress=0, filename=fields.get('filename'),
+                           is_paper=fields.get('is_paper'), created_at=time.time())
+        self._executor().submit(self._run, job_id, spool_path, fields, upload_options)
+        return job_id
+
+    def _run(self, job_id, spool_path, fields, upload_options):
+        try:
+            uploader = self.uploader or default_uploader()
+            upload_result = None
+            for attempt in range(1, UPLOAD_RETRIES + 1):
+                self._write_status(job_id, status="uploading", progress=10, attempt=attempt)
+                try:
+                    upload_result = uploader.upload_large(spool_path, chunk_size=UPLOAD_CHUNK_SIZE, **upload_options)
+                    break
+                except Exception as err:
+                    print(f"Upload attempt {attempt} for job {job_id} failed: {err}")
+                    if attempt == UPLOAD_RETRIES:
+                        raise
+                    time.sleep(UPLOAD_RETRY_BACKOFF * attempt)
+            self._write_status(job_id, status="saving", progress=80, public_id=upload_result.get('public_id'))
+            book_id = self.finalize(fields, upload_result)
+            self._write_status(job_id, status="done", progress=100, book_id=book_id)
+        except Exception as err:
+            print(f"Upload job {job_id} failed: {err}")
+            self._write_status(job_id, status="failed", error=str(err))
+        finally:
+            try:
+                os.unlink(spool_path)
+            except OSError:
+                pass
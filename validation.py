@@ -0,0 +1,106 @@
+import os
+import re
+from functools import lru_cache
+
+DEFAULT_COUNTRY = os.getenv('PHONE_DEFAULT_COUNTRY', 'ZW')
+PHONE_CACHE_SIZE = int(os.getenv('PHONE_CACHE_SIZE', 65536))
+
+#Compiled once at import instead of on every call
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-z]{2,3}$')
+USERNAME_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9]{2,19}$')
+NATIONAL_ID_PATTERN = re.compile(r'^[0-9]{2}([-\s]?)[0-9]{6,7}\1[a-zA-Z]\1[0-9]{2}$')
+_PHONE_STRIP = re.compile(r'[^0-9+]')
+
+PHONE_REQUIRED = "phone number is requiered"
+PHONE_INVALID = "Invalid phone number"
+PHONE_UNPARSABLE = "Wrong phone number parsing method"
+EMAIL_REQUIRED = "Email is required"
+EMAIL_INVALID = "Invalid email entered"
+USERNAME_REQUIRED = "Username is required "
+USERNAME_INVALID = "Invalid username has been entered"
+NATIONAL_ID_REQUIRED = "ID Number is required"
+NATIONAL_ID_INVALID = "Invalid ID number format entered"
+
+
+#--------------------phone number to E164 digits---------------
+#Returns (digits, None) or (None, error). The phonenumbers parse is cached on the stripped number,
+#so "+263 77 123 4567" and "+263771234567" share one entry
+def normalize_phone(phone, country=DEFAULT_COUNTRY):
+    if not phone or str(phone).strip() == "":
+        return None, PHONE_REQUIRED
+    return _normalize_stripped(_PHONE_STRIP.sub("", str(phone)), country)
+
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def _normalize_stripped(phone, country):
+    if not phone.strip("+"):
+        return None, PHONE_UNPARSABLE
+    #E164 numbers have at most 15 digits; anything far outside that is rejected without parsing
+    if not 5 <= len(phone) <= 16:
+        return None, PHONE_INVALID
+    import phonenumbers
+    try:
+        number = phonenumbers.parse(phone, country)
+    except phonenumbers.NumberParseException:
+        return None, PHONE_UNPARSABLE
+    if not phonenumbers.is_valid_number(number):
+        return None, PHONE_INVALID
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)[1:], None
+
+
+def validate_email(email):
+    if not email or email.strip() == "":
+        return EMAIL_REQUIRED
+    if not EMAIL_PATTERN.match(email):
+        return EMAIL_INVALID
+    return None
+
+
+def validate_username(text):
+    if not text or text.strip() == "":
+        return USERNAME_REQUIRED
+    if not USERNAME_PATTERN.match(text):
+        return USERNAME_INVALID
+    return None
+
+
+def validate_national_id(id_number):
+    if not id_number or id_number.strip() == "":
+        return NATIONAL_ID_REQUIRED
+    if not NATIONAL_ID_PATTERN.fullmatch(id_number):
+        return NATIONAL_ID_INVALID
+    return None
+
+
+#--------------------validate many user records at once---------------
+#Each record is a dict; only the fields present are checked (phone, email, username, national_id).
+#Returns one {"index", "valid", "phone", "errors"} per record, in input order, with errors keyed by field
+def validate_many(records, country=DEFAULT_COUNTRY):
+    strip_phone = _PHONE_STRIP.sub
+    normalize = _normalize_stripped
+    checks = (("email", validate_email), ("username", validate_username), ("national_id", validate_national_id))
+    results = []
+    append = results.append
+    for index, record in enumerate(records):
+        errors = {}
+        phone = None
+        if 'phone' in record:
+            raw = record['phone']
+            if not raw or str(raw).strip() == "":
+                errors['phone'] = PHONE_REQUIRED
+            else:
+                phone, error = normalize(strip_phone("", str(raw)), country)
+                if error:
+                    errors['phone'] = error
+        for field, check in checks:
+            if field in record:
+                error = check(record[field])
+                if error:
+                    errors[field] = error
+        append({"index": index, "valid": not errors, "phone": phone, "errors": errors})
+    return results
+
+
+def validation_stats():
+    info = _normalize_stripped.cache_info()
+    return {"phone_cache_hits": info.hits, "phone_cache_misses": info.misses, "phone_cache_size": info.currsize}